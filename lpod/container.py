@@ -29,19 +29,284 @@
 import os
 import sys
 import shutil
-from copy import deepcopy
+import struct
+from base64 import b64encode
+from binascii import crc32
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy, deepcopy
 from io import BytesIO
-from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, BadZipfile
+from mmap import mmap, ACCESS_READ
+from tempfile import mkstemp
+from threading import Lock
+from time import localtime, time
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo, BadZipfile
+try:
+    import zlib
+except ImportError:
+    # Will store parts uncompressed
+    zlib = None
+
+# Import from lxml
+from lxml.etree import Element, ElementTree, XMLSyntaxError
+from lxml.etree import fromstring, iterparse, tostring
 
 # Import from lpod
 from .const import ODF_MIMETYPES, ODF_PARTS, ODF_TYPES, ODF_MANIFEST
 from .const import ODF_CONTENT, ODF_META, ODF_SETTINGS, ODF_STYLES
 from .const import ODF_EXTENSIONS
+from .element import ODF_NAMESPACES
 from .manifest import odf_manifest
 from .utils import _get_abspath  #, obsolete
 from .scriptutils import printwarn
 
 
+class _mapped_file(mmap):
+    """Read-only memory map of an ODF file. The zipfile module also expects
+    "seekable" on the file-like objects it reads.
+    """
+
+    def seekable(self):
+        return True
+
+
+
+def _map_file(file):
+    """Return a read-only memory map of the given open file, or its bytes
+    when it cannot be mapped (not a real file, empty file, pipe...). The file
+    is closed afterwards, the map doesn't need it.
+    """
+    try:
+        if file.tell() != 0:
+            raise ValueError("file already read")
+        fileno = file.fileno()
+        data = _mapped_file(fileno, 0, access=ACCESS_READ)
+        # To recognize the file when saving over it
+        stat = os.fstat(fileno)
+        data.file_id = (stat.st_dev, stat.st_ino)
+    except (AttributeError, OSError, ValueError):
+        data = file.read()
+    file.close()
+    return data
+
+
+
+# Local file header of a zip member, see the zipfile module
+_zip_header = struct.Struct('<4s2B4HL2L2H')
+_ZIP_DATA_DESCRIPTOR = 0x08
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+
+def _write_zip_raw(filezip, zinfo, chunks):
+    """Write a member which data is already compressed as told by
+    "zinfo", CRC and sizes included. As ZipFile has no public API for this,
+    do what it does itself when writing a directory entry.
+    """
+    with filezip._lock:
+        if filezip._seekable:
+            filezip.fp.seek(filezip.start_dir)
+        zinfo.header_offset = filezip.fp.tell()
+        filezip._writecheck(zinfo)
+        filezip._didModify = True
+        filezip.fp.write(zinfo.FileHeader())
+        for chunk in chunks:
+            filezip.fp.write(chunk)
+        filezip.filelist.append(zinfo)
+        filezip.NameToInfo[zinfo.filename] = zinfo
+        filezip.start_dir = filezip.fp.tell()
+
+
+
+def _is_seekable(file):
+    """Whether the zip module can seek the given output file, else it would
+    write data descriptors after each member.
+    """
+    try:
+        if not file.seekable():
+            return False
+        file.seek(file.tell())
+    except (AttributeError, OSError):
+        return False
+    return True
+
+
+
+def _compress(data, compress_type=ZIP_DEFLATED, level=None):
+    """Compress a part like ZipFile does, or just store it. Return its CRC,
+    size and compressed bytes.
+    """
+    if type(data) is str:
+        data = data.encode('utf-8')
+    if compress_type == ZIP_STORED:
+        return crc32(data), len(data), data
+    if level is None:
+        level = zlib.Z_DEFAULT_COMPRESSION
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    deflated = compressor.compress(data) + compressor.flush()
+    return crc32(data), len(data), deflated
+
+
+
+def _new_zip_info(path, compress_type):
+    """Make the ZipInfo of a new member, as ZipFile.writestr would do.
+    """
+    zinfo = ZipInfo(path, localtime(time())[:6])
+    zinfo.compress_type = compress_type
+    if path.endswith('/'):
+        zinfo.external_attr = 0o40775 << 16 | 0x10
+    else:
+        zinfo.external_attr = 0o600 << 16
+    return zinfo
+
+
+
+def _write_zip_compressed(filezip, path, compress_type, compressed):
+    """Write a member which data was compressed by "_compress".
+    """
+    crc, size, data = compressed
+    zinfo = _new_zip_info(path, compress_type)
+    zinfo.CRC = crc
+    zinfo.file_size = size
+    zinfo.compress_size = len(data)
+    _write_zip_raw(filezip, zinfo, (data,))
+
+
+
+# Flat XML: where the children of office:document go, in order
+_OFFICE = '{%s}' % ODF_NAMESPACES['office']
+_FLAT_CHILDREN = (
+        ('meta', (ODF_META,)),
+        ('settings', (ODF_SETTINGS,)),
+        ('scripts', (ODF_CONTENT,)),
+        ('font-face-decls', (ODF_CONTENT, ODF_STYLES)),
+        ('styles', (ODF_STYLES,)),
+        ('automatic-styles', (ODF_CONTENT, ODF_STYLES)),
+        ('master-styles', (ODF_STYLES,)),
+        ('body', (ODF_CONTENT,)))
+_FLAT_PART_ROOTS = {
+        ODF_CONTENT: 'document-content',
+        ODF_META: 'document-meta',
+        ODF_SETTINGS: 'document-settings',
+        ODF_STYLES: 'document-styles'}
+_FLAT_MANIFEST = (b'<?xml version="1.0" encoding="UTF-8"?>\n'
+        b'<manifest:manifest xmlns:manifest='
+        b'"urn:oasis:names:tc:opendocument:xmlns:manifest:1.0">\n'
+        b' <manifest:file-entry manifest:media-type="%s" '
+        b'manifest:full-path="/"/>\n'
+        b'%s</manifest:manifest>\n')
+_FLAT_MANIFEST_ENTRY = (b' <manifest:file-entry manifest:media-type='
+        b'"text/xml" manifest:full-path="%s"/>\n')
+
+
+
+def _iter_flat_children(source):
+    """Parse the flat XML ODF from the file-like "source" and yield
+    (document, child) pairs as each child of the root element is complete.
+    """
+    depth = 0
+    try:
+        for event, element in iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                if depth == 0 and element.tag != _OFFICE + 'document':
+                    raise ValueError("not a flat XML OpenDocument")
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 1:
+                    yield element.getparent(), element
+    except XMLSyntaxError as e:
+        raise ValueError(str(e))
+
+
+
+def _split_flat_xml(data):
+    """Split a flat XML ODF in its parts, in one pass over the data, as a
+    dict of path to bytes. The older lpOD layout, a whole
+    office:document-content (-meta, etc.) in office:document, is also read.
+    """
+    if isinstance(data, _mapped_file):
+        data.seek(0)
+        source = data
+    else:
+        source = BytesIO(data)
+    children = dict(_FLAT_CHILDREN)
+    parts = {}
+    roots = {}
+    document = None
+    for document, element in _iter_flat_children(source):
+        name = element.tag[len(_OFFICE):]
+        if not element.tag.startswith(_OFFICE):
+            printwarn('unexpected "%s" in flat XML' % element.tag)
+        elif name.startswith('document-'):
+            for path, root_name in _FLAT_PART_ROOTS.items():
+                if root_name == name:
+                    parts[path] = tostring(element, encoding='UTF-8',
+                            xml_declaration=True)
+                    break
+        elif name in children:
+            for i, path in enumerate(children[name]):
+                root = roots.get(path)
+                if root is None:
+                    root = Element(_OFFICE + _FLAT_PART_ROOTS[path],
+                            nsmap=document.nsmap)
+                    version = document.get(_OFFICE + 'version')
+                    if version is not None:
+                        root.set(_OFFICE + 'version', version)
+                    roots[path] = root
+                # Moved, then copied for the next part
+                root.append(element if i == 0 else deepcopy(element))
+                element = root[-1]
+        else:
+            printwarn('unexpected "office:%s" in flat XML' % name)
+        # What was moved is already gone
+        if element.getparent() is document:
+            document.remove(element)
+    if document is None:
+        raise ValueError("empty flat XML OpenDocument")
+    for path, root in roots.items():
+        parts[path] = tostring(root, encoding='UTF-8', xml_declaration=True)
+    mimetype = document.get(_OFFICE + 'mimetype', '').encode('utf-8')
+    parts['mimetype'] = mimetype
+    entries = [_FLAT_MANIFEST_ENTRY % path.encode('utf-8')
+            for path in (ODF_CONTENT, ODF_STYLES, ODF_META, ODF_SETTINGS)
+            if path in parts]
+    parts[ODF_MANIFEST] = _FLAT_MANIFEST % (mimetype, b''.join(entries))
+    return parts
+
+
+
+def _same_element(element, other):
+    """Compare elements by their tag, attributes, text and children, but
+    not the namespaces their tree declares.
+    """
+    if (element.tag != other.tag or element.attrib != other.attrib
+            or (element.text or '').strip() != (other.text or '').strip()
+            or len(element) != len(other)):
+        return False
+    return all(_same_element(child, other_child)
+            for child, other_child in zip(element, other))
+
+
+
+def _merge_flat_children(element, other):
+    """Add to "element" the children of "other" it doesn't have yet, by
+    tag and style name, e.g. automatic styles of content and styles.
+    """
+    style_name = '{%s}name' % ODF_NAMESPACES['style']
+    known = {}
+    for child in element:
+        known[child.tag, child.get(style_name)] = child
+    for child in list(other):
+        key = child.tag, child.get(style_name)
+        if key not in known:
+            element.append(child)
+            known[key] = child
+        elif not _same_element(known[key], child):
+            printwarn('"%s" differs in content and styles, keeping the '
+                    'first one' % key[1])
+
+
+
 class odf_container(object):
     """Representation of the ODF file.
     """
@@ -49,6 +314,8 @@ class odf_container(object):
     __zipfile = None
     # Using zip archive
     __packaging = None  # None, 'zip', 'flat', 'folder'
+    # The parts of an XML-only ODF, split once
+    __xml_parts = None
 
 
     def __init__(self, path_or_file):
@@ -79,10 +346,12 @@ class odf_container(object):
                 mimetype = ODF_EXTENSIONS['odt']
             self.__parts = {'mimetype': mimetype}
             self.__parts_ts = {'mimetype': timestamp}
+            self.__modified = set()
         else:
-            self.__data = data = file.read()
-            file.close()
-            zip_expected = data[:4] == 'PK\x03\x04'
+            # The archive is mapped, not read: parts are only inflated when
+            # asked for
+            self.__data = data = _map_file(file)
+            zip_expected = data[:4] == b'PK\x03\x04'
             # Most probably zipped document
             try:
                 mimetype = self.__get_zip_part('mimetype')
@@ -100,6 +369,8 @@ class odf_container(object):
                 message = 'Document of unknown type "%s"' % mimetype
                 raise ValueError(message)
             self.__parts = {'mimetype': mimetype}
+            # Parts set or deleted since loaded
+            self.__modified = set()
 
 
     #
@@ -107,44 +378,110 @@ class odf_container(object):
     #
 
     def __get_data(self):
-        """Return bytes of the ODF in memory.
+        """Return bytes of the ODF, in memory or mapped from the file.
         """
         return self.__data
 
 
     # XML implementation
 
+    def __get_xml_split(self):
+        """Split the XML-only ODF in its parts, once.
+        """
+        if self.__xml_parts is None:
+            self.__xml_parts = _split_flat_xml(self.__get_data())
+        return self.__xml_parts
+
+
     def __get_xml_parts(self):
         """Get the list of members in the XML-only ODF.
         """
-        raise NotImplementedError
+        return list(self.__get_xml_split().keys())
 
 
     def __get_xml_part(self, name):
-        """Get bytes of a part from the XML-only ODF. No cache.
+        """Get bytes of a part from the XML-only ODF.
         """
-        if name not in ODF_PARTS and name != 'mimetype':
+        if name in ODF_PARTS:
+            # "content" for "content.xml"
+            name = name + '.xml'
+        try:
+            return self.__get_xml_split()[name]
+        except KeyError:
             raise ValueError("Third-party parts are not supported "
                                "in an XML-only ODF document")
-        data = self.__get_data()
-        if name == 'mimetype':
-            start_attr = 'office:mimetype="'
-            start = data.index(start_attr) + len(start_attr)
-            end = data.index('"', start)
-            part = data[start:end]
-        else:
-            start_tag = '<office:document-%s>' % name
-            start = data.index(start_tag)
-            end_tag = '</office:document-%s>' % name
-            end = data.index(end_tag) + len(end_tag)
-            part = data[start:end]
-        return part
 
 
     def __save_xml(self, file):
-        """Save an XML-only ODF from the available parts.
+        """Save an XML-only ODF from the available parts. Parts are moved
+        under a single office:document, merging the font declarations and
+        automatic styles of content and styles, then serialized to the file
+        as it goes. Images are embedded, other parts are lost.
         """
-        raise NotImplementedError
+        parts = self.__parts
+        trees = {}
+        for path in ODF_CONTENT, ODF_META, ODF_SETTINGS, ODF_STYLES:
+            data = parts.get(path)
+            if data is None:
+                printwarn("missing '%s'" % path)
+                continue
+            if type(data) is str:
+                data = data.encode('utf-8')
+            trees[path] = fromstring(data)
+        # Images are embedded, encoded in base64
+        embedded = set()
+        href = '{%s}href' % ODF_NAMESPACES['xlink']
+        for tree in trees.values():
+            for image in tree.iter('{%s}image' % ODF_NAMESPACES['draw']):
+                path = image.get(href)
+                if path not in parts or path in trees:
+                    continue
+                try:
+                    data = self.get_part(path)
+                except ValueError:
+                    continue
+                for name in list(image.attrib):
+                    if name.startswith('{%s}' % ODF_NAMESPACES['xlink']):
+                        del image.attrib[name]
+                binary_data = Element(_OFFICE + 'binary-data')
+                binary_data.text = b64encode(data).decode('ascii')
+                image.insert(0, binary_data)
+                embedded.add(path)
+        for path, data in parts.items():
+            if (data is not None and path not in trees
+                    and path not in embedded
+                    and path not in ('mimetype', ODF_MANIFEST)
+                    and not path.endswith('/')):
+                printwarn("'%s' cannot be saved in an XML-only ODF" % path)
+        nsmap = {}
+        for tree in trees.values():
+            nsmap.update(tree.nsmap)
+        mimetype = self.get_part('mimetype')
+        if type(mimetype) is bytes:
+            mimetype = mimetype.decode('utf-8')
+        document = Element(_OFFICE + 'document', nsmap=nsmap)
+        for tree in trees.values():
+            version = tree.get(_OFFICE + 'version')
+            if version is not None:
+                document.set(_OFFICE + 'version', version)
+                break
+        document.set(_OFFICE + 'mimetype', mimetype)
+        for name, paths in _FLAT_CHILDREN:
+            merged = None
+            for path in paths:
+                tree = trees.get(path)
+                if tree is None:
+                    continue
+                child = tree.find(_OFFICE + name)
+                if child is None:
+                    continue
+                if merged is None:
+                    merged = child
+                    document.append(child)
+                else:
+                    _merge_flat_children(merged, child)
+        ElementTree(document).write(file, encoding='UTF-8',
+                xml_declaration=True)
 
 
     # Zip implementation
@@ -154,8 +491,12 @@ class odf_container(object):
         """
         if self.__zipfile is None:
             data = self.__get_data()
-            # StringIO will not duplicate the string, how big it is
-            filelike = BytesIO(data)
+            if isinstance(data, _mapped_file):
+                # Read members straight from the map
+                filelike = data
+            else:
+                # BytesIO will not duplicate the bytes, how big they are
+                filelike = BytesIO(data)
             self.__zipfile = ZipFile(filelike)
         return self.__zipfile
 
@@ -175,49 +516,189 @@ class odf_container(object):
         return zipfile.read(path)
 
 
-    def __save_zip(self, file):
-        """Save a Zip ODF from the available parts.
+    def __get_zip_source(self, path):
+        """Get the ZipInfo of the part in the source Zip ODF, if the part is
+        still the same, so it can be copied as is. None otherwise.
+        """
+        if self.__packaging != 'zip' or path in self.__modified:
+            return None
+        try:
+            return self.__get_zipfile().getinfo(path)
+        except KeyError:
+            return None
+
+
+    def __copy_zip_part(self, filezip, zinfo):
+        """Copy a member from the source Zip ODF to the given ZipFile,
+        without decompressing and recompressing it.
+        """
+        data = self.__get_data()
+        offset = zinfo.header_offset
+        header = _zip_header.unpack(data[offset:offset + _zip_header.size])
+        start = offset + _zip_header.size + header[10] + header[11]
+        end = start + zinfo.compress_size
+
+        def chunks():
+            for position in range(start, end, _COPY_CHUNK_SIZE):
+                yield data[position:min(position + _COPY_CHUNK_SIZE, end)]
+
+        copy = ZipInfo(zinfo.filename, zinfo.date_time)
+        copy.compress_type = zinfo.compress_type
+        # CRC and sizes are known, written in the header, not after data
+        copy.flag_bits = zinfo.flag_bits & ~_ZIP_DATA_DESCRIPTOR
+        copy.external_attr = zinfo.external_attr
+        copy.CRC = zinfo.CRC
+        copy.compress_size = zinfo.compress_size
+        copy.file_size = zinfo.file_size
+        _write_zip_raw(filezip, copy, chunks())
+
+
+    def __get_compress_types(self, paths, compression, store):
+        """Map each path to ZIP_STORED or "compression", storing the parts
+        which extension or media type is in "store". A media type ending
+        with "/" stands for all of its subtypes, e.g. "image/". Media types
+        are read from the manifest.
+        """
+        compress_types = dict.fromkeys(paths, compression)
+        for path in paths:
+            if path.endswith('/'):
+                compress_types[path] = ZIP_STORED
+        if not store or compression == ZIP_STORED:
+            return compress_types
+        extensions = set()
+        media_types = set()
+        for kind in store:
+            if kind.startswith('.'):
+                extensions.add(kind.lower())
+            else:
+                media_types.add(kind)
+        path_medias = {}
+        if media_types:
+            manifest = odf_manifest(ODF_MANIFEST, self)
+            path_medias = dict(manifest.get_path_medias())
+        for path in paths:
+            extension = os.path.splitext(path)[1].lower()
+            media_type = path_medias.get(path, '')
+            if (extension in extensions or media_type in media_types
+                    or media_type.split('/', 1)[0] + '/' in media_types):
+                compress_types[path] = ZIP_STORED
+        return compress_types
+
+
+    def __save_zip(self, file, workers=None, store=None, level=None):
+        """Save a Zip ODF from the available parts. Parts left unchanged are
+        copied from the source archive, as long as they are compressed the
+        way "store" tells, if given. Modified parts are compressed by as
+        many threads as "workers", if given. The file doesn't need to be
+        seekable, members are written one after another.
         """
-        # Parts were loaded by "save"
         parts = self.__parts
         compression = ZIP_DEFLATED
         try:
-            filezip = ZipFile(file, 'w', compression=compression)
+            filezip = ZipFile(file, 'w', compression=compression,
+                    compresslevel=level)
         except RuntimeError:
             # No zlib module
             compression = ZIP_STORED
             filezip = ZipFile(file, 'w', compression=compression)
         # Parts to save, except manifest at the end
         part_names = list(parts.keys())
+        if self.__packaging == 'zip':
+            # Parts not loaded were not modified
+            for path in self.__get_zip_parts():
+                if path not in parts:
+                    part_names.append(path)
         try:
             part_names.remove(ODF_MANIFEST)
-        except KeyError:
+        except ValueError:
             printwarn("missing '%s'" % ODF_MANIFEST)
         # "Pretty-save" parts in some order
         # mimetype requires to be first and uncompressed
-        filezip.compression = ZIP_STORED
         try:
-            filezip.writestr('mimetype', parts['mimetype'])
-            filezip.compression = compression
             part_names.remove('mimetype')
-        except:
+        except ValueError:
             printwarn("missing 'mimetype'")
         # XML parts
+        ordered = []
         for path in ODF_CONTENT, ODF_META, ODF_SETTINGS, ODF_STYLES:
-            if path not in parts:
+            if path not in part_names:
                 printwarn("missing '%s'" % path)
                 continue
-            filezip.writestr(path, parts[path])
+            ordered.append(path)
             part_names.remove(path)
         # Everything else
         for path in part_names:
-            data = parts[path]
-            if data is None:
+            if parts.get(path, '') is None:
                 # Deleted
                 continue
-            filezip.writestr(path, data)
+            ordered.append(path)
         # Manifest
-        filezip.writestr(ODF_MANIFEST, parts[ODF_MANIFEST])
+        ordered.append(ODF_MANIFEST)
+        compress_types = self.__get_compress_types(ordered, compression,
+                store)
+        # Copy parts unchanged, and compressed the expected way if we were
+        # told what to store
+        sources = {}
+        for path in ordered:
+            zinfo = self.__get_zip_source(path)
+            if zinfo is not None:
+                if (store is None
+                        or zinfo.compress_type == compress_types[path]):
+                    sources[path] = zinfo
+                elif path not in parts:
+                    # Load it to compress it again
+                    self.get_part(path)
+        # Compress modified parts in advance, zlib releases the GIL
+        executor = None
+        deflated = {}
+        if workers and compression == ZIP_DEFLATED:
+            executor = ThreadPoolExecutor(workers)
+            for path in ordered:
+                if (path not in sources and not path.endswith('/')
+                        and compress_types[path] == ZIP_DEFLATED
+                        and not callable(parts[path])):
+                    deflated[path] = executor.submit(_compress, parts[path],
+                            ZIP_DEFLATED, level)
+        # Writing to a pipe, the zipfile module would put the CRC and sizes
+        # after the data (not allowed for mimetype), compress each part first
+        # so they go in the header
+        streaming = not _is_seekable(file)
+        try:
+            mimetype = self.get_part('mimetype')
+            if streaming:
+                _write_zip_compressed(filezip, 'mimetype', ZIP_STORED,
+                        _compress(mimetype, ZIP_STORED))
+            else:
+                filezip.writestr('mimetype', mimetype,
+                        compress_type=ZIP_STORED)
+            for path in ordered:
+                compress_type = compress_types[path]
+                if path in sources:
+                    self.__copy_zip_part(filezip, sources[path])
+                elif path in deflated:
+                    _write_zip_compressed(filezip, path, compress_type,
+                            deflated[path].result())
+                elif callable(parts[path]):
+                    # Straight into the compressor
+                    zinfo = _new_zip_info(path, compress_type)
+                    zinfo._compresslevel = level
+                    with filezip.open(zinfo, 'w') as dest:
+                        parts[path](dest)
+                elif streaming:
+                    _write_zip_compressed(filezip, path, compress_type,
+                            _compress(parts[path], compress_type, level))
+                else:
+                    filezip.writestr(path, parts[path],
+                            compress_type=compress_type)
+        except:
+            # Close without the central directory, not to let the garbage
+            # collector try again later on a broken file
+            filezip._didModify = False
+            filezip.close()
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown()
         filezip.close()
 
 
@@ -342,6 +823,12 @@ class odf_container(object):
             part = loaded_parts[path]
             if part is None:
                 raise ValueError('part "%s" is deleted' % path)
+            if callable(part):
+                # Written on demand
+                data = BytesIO()
+                part(data)
+                part = loaded_parts[path] = data.getvalue()
+                return part
             if self.__packaging == 'folder':
                 cache_ts = self.__parts_ts.get(path, -1)
                 current_ts = self.__get_folder_part_timestamp(path)
@@ -363,26 +850,43 @@ class odf_container(object):
 
     def set_part(self, path, data):
         """Replace or add a new part.
+
+        The data can also be a function writing the part to the (binary)
+        file it is given, so it is streamed when saving.
         """
         self.__parts[path] = data
+        self.__modified.add(path)
 
 
     def del_part(self, path):
         """Mark a part for deletion.
         """
         self.__parts[path] = None
+        self.__modified.add(path)
 
 
     def clone(self):
         """Make a copy of this container with no path.
         """
         # FIXME must load parts before?
+        # Parts to write will not be the same later
+        for path, data in list(self.__parts.items()):
+            if callable(data):
+                self.get_part(path)
         clone = object.__new__(self.__class__)
         for name in self.__dict__:
             # "__zipfile" is not safe to copy
             # but can be recreated from "__data"
             if name in ('path', '_odf_container__zipfile'):
                 setattr(clone, name, None)
+            elif name in ('_odf_container__data',
+                    '_odf_container__xml_parts'):
+                # Read-only, the map (or bytes) can be shared
+                setattr(clone, name, getattr(self, name))
+            elif name in ('_odf_container__parts', '_odf_container__parts_ts',
+                    '_odf_container__modified'):
+                # Parts are replaced, never changed in place: share them
+                setattr(clone, name, copy(getattr(self, name)))
             else:
                 value = getattr(self, name)
                 value = deepcopy(value)
@@ -390,6 +894,20 @@ class odf_container(object):
         return clone
 
 
+    def __is_mapped_from(self, path):
+        """Tell whether the file at the given path is the one this container
+        is mapped from, so it must not be overwritten in place.
+        """
+        data = self.__data
+        if not isinstance(data, _mapped_file):
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return (stat.st_dev, stat.st_ino) == data.file_id
+
+
     def _do_backup(self, target):
         parts = target.split('.', 1)
         if len(parts) == 1:
@@ -408,13 +926,22 @@ class odf_container(object):
                 printwarn(str(e))
 
 
-    def save(self, target=None, packaging=None, backup=False):
+    def save(self, target=None, packaging=None, backup=False, workers=None,
+            store=None, level=None):
         """Save the container to the given target, a path or a file-like
         object.
 
         Package the output document in the same format than this document,
         unless "packaging" is different.
 
+        Modified parts of a zip document can be compressed in parallel by
+        the given number of "workers" threads. The output is the same.
+
+        Parts of a zip document are deflated, except those which extension
+        or media type is listed in "store", e.g. ['.jpg', 'image/png',
+        'video/']. Media types are read from the manifest. The zlib "level"
+        of modified parts goes from 0 (fastest) to 9 (smallest).
+
         Arguments:
 
             target -- str or file-like
@@ -422,6 +949,12 @@ class odf_container(object):
             packaging -- 'zip' or 'flat', or for debugging purpose 'folder'
 
             backup -- boolean
+
+            workers -- int
+
+            store -- list of str
+
+            level -- int
         """
         #if not isinstance(target, str):
         #    encoding = sys.getfilesystemencoding()
@@ -436,12 +969,19 @@ class odf_container(object):
         packaging = packaging.strip().lower()
         if packaging not in ('zip', 'flat', 'folder'):
             raise ValueError('packaging type "%s" not supported' % packaging)
-        # Load parts else they will be considered deleted
-        for path in self.get_parts():
-            if path not in parts:
-                self.get_part(path)
+        # Load parts else they will be considered deleted, unless they are
+        # copied from the source archive
+        if self.__packaging != 'zip' or packaging != 'zip':
+            for path in self.get_parts():
+                if path not in parts:
+                    self.get_part(path)
+            # And write them in memory
+            for path, data in list(parts.items()):
+                if callable(data):
+                    self.get_part(path)
         # Open output file
         close_after = False
+        replace_after = None
         if target is None:
             target = self.path
         if isinstance(target, str):
@@ -453,7 +993,14 @@ class odf_container(object):
             if isinstance(target, str):
                 if backup:
                     self._do_backup(target)
-                dest_file = open(target, 'wb')
+                if self.__is_mapped_from(target):
+                    # Truncating the file would pull the rug from under the
+                    # map, write aside and replace it at the end
+                    folder = os.path.dirname(os.path.abspath(target))
+                    fd, replace_after = mkstemp(dir=folder)
+                    dest_file = os.fdopen(fd, 'wb')
+                else:
+                    dest_file = open(target, 'wb')
                 close_after = True
             else:
                 dest_file = target
@@ -475,15 +1022,25 @@ class odf_container(object):
             os.mkdir(target, 0o777)
             dest_file = target
         # Serialize
-        if packaging == 'zip':
-            self.__save_zip(dest_file)
-        elif packaging == 'flat':
-            self.__save_xml(dest_file)
-        else: # folder
-            self.__save_folder(dest_file)
+        try:
+            if packaging == 'zip':
+                self.__save_zip(dest_file, workers=workers, store=store,
+                        level=level)
+            elif packaging == 'flat':
+                self.__save_xml(dest_file)
+            else: # folder
+                self.__save_folder(dest_file)
+        except:
+            if replace_after is not None:
+                dest_file.close()
+                os.remove(replace_after)
+            raise
         # Close files we opened ourselves
         if close_after:
             dest_file.close()
+        if replace_after is not None:
+            shutil.copymode(target, replace_after)
+            os.replace(replace_after, target)
 
 
 
@@ -495,21 +1052,65 @@ def odf_get_container(path_or_file):
 
 
 
+# Templates ready to clone, by absolute path: (mtime, size, container)
+__templates = {}
+__templates_lock = Lock()
+
+
+def _get_template(path):
+    """Return the container of the template at the given path, ready to be
+    cloned: loaded once, and again if the file changed since.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with __templates_lock:
+        cached = __templates.get(path)
+        if cached is not None and cached[:2] == signature:
+            return cached[2]
+        # Read, not mapped, the file may change while we keep it
+        with open(path, 'rb') as file:
+            template = odf_container(BytesIO(file.read()))
+        _make_regular(template)
+        __templates[path] = signature + (template,)
+        return template
+
+
+
+def clear_template_cache():
+    """Forget the templates loaded by "odf_new_container" so far.
+    """
+    with __templates_lock:
+        __templates.clear()
+
+
+
+def _make_regular(container):
+    """Change the type of the container from template to regular document.
+    """
+    mimetype = container.get_part('mimetype').decode().replace('-template',
+            '')
+    container.set_part('mimetype', mimetype)
+    # Update the manifest
+    manifest = odf_manifest(ODF_MANIFEST, container)
+    manifest.set_media_type('/', mimetype)
+    container.set_part(ODF_MANIFEST, manifest.serialize())
+
+
+
 def odf_new_container(path_or_file):
     """Return an odf_container instance based on the given template.
+
+    Templates given by type or path are loaded once and cloned afterwards.
     """
     if path_or_file in ODF_TYPES:
         path_or_file = _get_abspath(ODF_TYPES[path_or_file])
+    if isinstance(path_or_file, str):
+        return _get_template(path_or_file).clone()
     template_container = odf_get_container(path_or_file)
     # Return a copy of the template container
     clone = template_container.clone()
-    # Change type from template to regular
-    mimetype = clone.get_part('mimetype').decode().replace('-template', '')
-    clone.set_part('mimetype', mimetype)
-    # Update the manifest
-    manifest = odf_manifest(ODF_MANIFEST, clone)
-    manifest.set_media_type('/', mimetype)
-    clone.set_part(ODF_MANIFEST, manifest.serialize())
+    _make_regular(clone)
     return clone
 
 #odf_new_document_from_template = obsolete('odf_new_document_from_template',
@@ -31,21 +31,25 @@
 import sys
 import os
 from copy import deepcopy
+from functools import partial
 from mimetypes import guess_type
 from operator import itemgetter
 from uuid import uuid4
+from weakref import WeakKeyDictionary
 
 # Import from lpod
 from .__init__ import __version__
 from .const import ODF_CONTENT, ODF_META, ODF_SETTINGS, ODF_STYLES
-from .const import ODF_MANIFEST
+from .const import ODF_MANIFEST, ODF_TYPES
 from .container import odf_get_container, odf_new_container, odf_container
+from .container import _get_template
 from .content import odf_content
 from .manifest import odf_manifest
 from .meta import odf_meta
 from .style import odf_style, odf_master_page, odf_font_style, odf_page_layout
 from .style import registered_styles
 from .styles import odf_styles
+from .utils import _get_abspath
 #from utils import obsolete
 from .xmlpart import odf_xmlpart
 
@@ -400,14 +404,19 @@ class odf_document(object):
         Return: odf_document
         """
         clone = object.__new__(self.__class__)
+        container = self.container.clone()
         for name in self.__dict__:
             if name == 'container':
-                setattr(clone, name, self.container.clone())
+                setattr(clone, name, container)
             elif name == '_odf_document__xmlparts':
+                # Trees are copied on write
                 xmlparts = {}
                 for key, value in self.__xmlparts.items():
-                    xmlparts[key] = value.clone()
+                    xmlparts[key] = value.clone(container)
                 setattr(clone, name, xmlparts)
+            elif name == '_odf_document__body':
+                # Found again in the cloned content
+                setattr(clone, name, None)
             else:
                 value = getattr(self, name)
                 value = deepcopy(value)
@@ -415,7 +424,8 @@ class odf_document(object):
         return clone
 
 
-    def save(self, target=None, packaging=None, pretty=False, backup=False):
+    def save(self, target=None, packaging=None, pretty=False, backup=False,
+            workers=None, store=None, level=None):
         """Save the document, at the same place it was opened or at the given
         target path. Target can also be a file-like object. It can be saved
         as a Zip file (default) or a flat XML file (unimplemented). XML parts
@@ -430,18 +440,27 @@ class odf_document(object):
             pretty -- bool
 
             backup -- boolean
+
+            workers -- int, number of threads to compress parts of a zip
+
+            store -- list of extensions and media types not to compress
+
+            level -- int, zlib compression level from 0 to 9
         """
         # Some advertising
         meta = self.get_part(ODF_META)
         if not meta._generator_modified:
             meta.set_generator("lpOD Python %s" % __version__)
-        # Synchronize data with container
+        # Synchronize data with container, parts left untouched are the
+        # same
         container = self.container
         for path, part in self.__xmlparts.items():
-            if part is not None:
-                container.set_part(path, part.serialize(pretty))
+            if part is not None and (pretty or part.is_modified()):
+                # Serialized when written
+                container.set_part(path, partial(part.write, pretty=pretty))
         # Save the container
-        container.save(target, packaging=packaging, backup=backup)
+        container.save(target, packaging=packaging, backup=backup,
+                workers=workers, store=store, level=level)
 
 
     #
@@ -772,6 +791,10 @@ def odf_get_document(path_or_file):
 
 
 
+# Parsed templates, forgotten along with their container
+__template_documents = WeakKeyDictionary()
+
+
 def odf_new_document(path_or_file):
     """Return an "odf_document" instance using the given template or the
     template found at the given path.
@@ -786,11 +809,26 @@ def odf_new_document(path_or_file):
     if "path" is one of 'text', 'spreadsheet', 'presentation', 'drawing' or
     'graphics', then the lpOD default template is used.
 
+    Templates are loaded and parsed once, and again if the file changed.
+    Use "lpod.container.clear_template_cache" to forget them.
+
     Examples::
 
         >>> document = odf_new_document('text')
 
         >>> document = odf_new_document('spreadsheet')
     """
-    container = odf_new_container(path_or_file)
-    return odf_document(container)
+    if path_or_file in ODF_TYPES:
+        path_or_file = _get_abspath(ODF_TYPES[path_or_file])
+    if not isinstance(path_or_file, str):
+        container = odf_new_container(path_or_file)
+        return odf_document(container)
+    # The template is parsed once, documents are copied on write from it
+    template = _get_template(path_or_file)
+    document = __template_documents.get(template)
+    if document is None:
+        document = odf_document(template)
+        for path in ODF_CONTENT, ODF_META, ODF_STYLES:
+            document.get_part(path).get_root()
+        __template_documents[template] = document
+    return document.clone()
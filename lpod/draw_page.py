@@ -67,6 +67,8 @@ def odf_create_draw_page(page_id=None, name=None, master_page=None,
 class odf_draw_page(odf_element):
     """Specialised element for pages of presentation and drawing.
     """
+    __slots__ = ()
+
     def get_name(self):
         return self.get_attribute('draw:name')
 
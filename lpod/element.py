@@ -30,6 +30,10 @@
 import sys
 from copy import deepcopy
 import re
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
+from weakref import WeakSet, finalize
 
 # Import from lxml
 from lxml.etree import fromstring, tostring, Element, _Element
@@ -39,6 +43,7 @@ from lxml.etree import XPath
 # Import from lpod
 from .datatype import DateTime, Boolean
 from .utils import _get_abspath, _get_elements, _get_element
+from .utils import _iter_elements
 from .utils import _get_style_tagname, get_value  #, obsolete
 
 
@@ -83,8 +88,6 @@ FIRST_CHILD, LAST_CHILD, NEXT_SIBLING, PREV_SIBLING, STOPMARKER = list(range(5))
 
 ns_stripper = re.compile(r' xmlns:\w*="[\w:\-\/\.#]*"')
 
-__xpath_query_cache = {}
-
 # An empty XML document with all namespaces declared
 ns_document_path = _get_abspath('templates/namespaces.xml')
 __file = open(ns_document_path, 'rb')
@@ -107,22 +110,48 @@ def _decode_qname(qname):
 
 
 
+# Reverse lookup of ODF_NAMESPACES
+__uri_prefixes = dict((uri, prefix) for prefix, uri in ODF_NAMESPACES.items())
+
+# "prefix:name" to lxml "{uri}name" syntax and back, filled as names are used
+__clark_names = {}
+__prefixed_names = {}
+
 def _uri_to_prefix(uri):
     """Find the prefix associated to the given URI.
     """
-    for key, value in ODF_NAMESPACES.items():
-        if value == uri:
-            return key
-    raise ValueError('uri "%s" not found' % uri)
+    prefix = __uri_prefixes.get(uri)
+    if prefix is None:
+        raise ValueError('uri "%s" not found' % uri)
+    return prefix
 
 
 
 def _get_prefixed_name(tag):
     """Replace lxml "{uri}name" syntax with "prefix:name" one.
     """
-    uri, name = tag.split('}', 1)
-    prefix = _uri_to_prefix(uri[1:])
-    return '%s:%s' % (prefix, name)
+    qname = __prefixed_names.get(tag)
+    if qname is None:
+        uri, name = tag.split('}', 1)
+        prefix = _uri_to_prefix(uri[1:])
+        qname = __prefixed_names[tag] = sys.intern('%s:%s' % (prefix, name))
+    return qname
+
+
+
+def _get_clark_name(qname):
+    """Replace "prefix:name" syntax with lxml "{uri}name" one. Names without
+    prefix are left untouched.
+    """
+    tag = __clark_names.get(qname)
+    if tag is None:
+        uri, name = _decode_qname(qname)
+        if uri is None:
+            tag = name
+        else:
+            tag = sys.intern('{%s}%s' % (uri, name))
+        __clark_names[qname] = tag
+    return tag
 
 
 
@@ -131,26 +160,183 @@ def _xpath_compile(path):
 
 
 
+@lru_cache(maxsize=1024)
 def _find_query_in_cache(query):
-    xpath = __xpath_query_cache.get(query, None)
-    if xpath is None:
-        xpath = _xpath_compile(query)
-        __xpath_query_cache[query] = xpath
-    return xpath
-
-
-_xpath_text = _find_query_in_cache("//text()")   #  descendant and self
-_xpath_text_descendant = _find_query_in_cache("descendant::text()")
-_xpath_text_main = _find_query_in_cache(
-                                '//*[not (parent::office:annotation)]/text()')
-_xpath_text_main_descendant = _find_query_in_cache(
-                        'descendant::text()[not (parent::office:annotation)]')
+    """Compile the XPath query, keeping the most recently used ones.
+
+    Give values as XPath variables ("$name") rather than spliced into the
+    query, so a single compiled query is reused for any value. See
+    "_find_query_in_cache.cache_info()" for the hits and misses.
+    """
+    return _xpath_compile(query)
+
+
+_plain_path = re.compile(r'^(descendant::)?([a-z][a-z0-9]*:[A-Za-z_][\w.-]*)'
+                         r'((?:\[@[a-z][a-z0-9]*:[A-Za-z_][\w.-]*'
+                         r'(?:=\$[A-Za-z_]\w*)?\])*)$')
+_plain_predicate = re.compile(r'\[@([^=\]]+)(?:=\$(\w+))?\]')
+
+@lru_cache(maxsize=1024)
+def _get_plain_path(query):
+    """Tell if the query only selects children or descendants by their
+    prefixed name, optionally filtered on attributes being present or equal
+    to a variable, e.g. "text:p" or "descendant::text:p[@text:style-name=$v0]".
+
+    Return: (descendant, tag, predicates) tuple or None, predicates being
+    (attribute, variable name or None) pairs
+    """
+    match = _plain_path.match(query)
+    if match is None:
+        return None
+    descendant, qname, predicates = match.groups()
+    try:
+        tag = _get_clark_name(qname)
+        predicates = tuple((_get_clark_name(name), variable or None)
+                for name, variable in _plain_predicate.findall(predicates))
+    except ValueError:
+        return None
+    return descendant is not None, tag, predicates
+
+
+
+def _iter_plain_path(native_element, query, variables):
+    """Iterate lazily over the native elements matching the query, walking
+    the tree instead of evaluating XPath.
+
+    Return: iterator or None if the query is not a plain path
+    """
+    plain_path = _get_plain_path(query)
+    if plain_path is None:
+        return None
+    descendant, tag, predicates = plain_path
+    # Only string values compare like attributes in XPath
+    tests = []
+    for name, variable in predicates:
+        if variable is None:
+            tests.append((name, None))
+            continue
+        value = variables.get(variable)
+        if type(value) is not str:
+            return None
+        tests.append((name, value))
+    if descendant:
+        elements = native_element.iterdescendants(tag)
+    else:
+        elements = native_element.iterchildren(tag)
+    if not tests:
+        return elements
+    if len(tests) == 1:
+        # The most common case, without the overhead of "all"
+        name, value = tests[0]
+        if value is None:
+            return (element for element in elements
+                    if element.get(name) is not None)
+        return (element for element in elements
+                if element.get(name) == value)
+    return (element for element in elements
+            if all(element.get(name) is not None if value is None
+                   else element.get(name) == value
+                   for name, value in tests))
+
+
+
+_annotation_tag = '{%s}annotation' % ODF_NAMESPACES['office']
+
+def _iter_text(native_element, main_text=False):
+    """Iterate over the text nodes below the given (native) element in
+    document order, like "descendant::text()" but without building a string
+    object that keeps a reference to its parent for each of them.
+
+    If main_text is True, skip the text directly in annotations, like
+    "descendant::text()[not (parent::office:annotation)]".
+
+    Return: iterator of (native element, is_tail, text) tuples, the text
+    being the text of the element, or its tail if is_tail is True
+    """
+    skip = _annotation_tag if main_text else None
+    text = native_element.text
+    if text and native_element.tag != skip:
+        yield native_element, False, text
+    stack = [(native_element, iter(native_element))]
+    while stack:
+        parent, children = stack[-1]
+        for child in children:
+            # Comments and processing instructions only have a tail
+            if type(child.tag) is str:
+                text = child.text
+                if text and child.tag != skip:
+                    yield child, False, text
+                stack.append((child, iter(child)))
+                break
+            tail = child.tail
+            if tail and parent.tag != skip:
+                yield child, True, tail
+        else:
+            stack.pop()
+            if stack:
+                tail = parent.tail
+                if tail and stack[-1][0].tag != skip:
+                    yield parent, True, tail
+
+
 #
 # Semi-Public API
 # (not in the lpOD specification but foundation of the Python implementation)
 #
 
+# XML parts told before their tree changes, by id of its root element
+__watched_trees = {}
+
+def _watch_tree(root, part):
+    """Call the "_before_change" method of the XML part with the given
+    (native) root element before its tree is changed, as long as the part
+    lives or until "_unwatch_tree" is called.
+    """
+    key = id(root)
+    parts = __watched_trees.get(key)
+    if parts is None:
+        parts = __watched_trees[key] = WeakSet()
+    parts.add(part)
+    finalize(part, _forget_tree, key)
+
+
+
+def _unwatch_tree(root, part):
+    """The XML part doesn't care about the tree of the given root element
+    anymore.
+    """
+    parts = __watched_trees.get(id(root))
+    if parts is not None:
+        parts.discard(part)
+        _forget_tree(id(root))
+
+
+
+def _forget_tree(key):
+    parts = __watched_trees.get(key)
+    if parts is not None and not parts:
+        del __watched_trees[key]
+
+
+
+def _before_change(*native_elements):
+    """Call before changing the given (native) elements, so XML parts know
+    about it first, e.g. clones sharing their tree to get their own copy.
+    """
+    if not __watched_trees:
+        return
+    for native_element in native_elements:
+        root = native_element.getroottree().getroot()
+        parts = __watched_trees.get(id(root))
+        if parts:
+            for part in list(parts):
+                part._before_change(root)
+
+
+
 __class_registry = {}
+# Tags with at least one class registered for a given family
+__family_tags = set()
 
 def register_element_class(qname, cls, family=None, caching=False):
     """Associate a qualified element name to a Python class that handles this
@@ -173,13 +359,17 @@ def register_element_class(qname, cls, family=None, caching=False):
         family -- str
     """
     # Turn tag name into what lxml is expecting
-    tag = '{%s}%s' % _decode_qname(qname)
+    tag = _get_clark_name(qname)
     if (tag, family) in __class_registry:
         #raise ValueError('element "%s" already registered' % qname)
         return # fix doc generation multi import
     __class_registry[(tag, family)] = (cls, caching)
+    if family is not None:
+        __family_tags.add(tag)
+
 
 
+_family_attribute = '{%s}family' % ODF_NAMESPACES['style']
 
 def _make_odf_element(native_element, cache=None):
     """Turn an lxml Element into an odf_element (or the registered subclass).
@@ -191,12 +381,16 @@ def _make_odf_element(native_element, cache=None):
     Return: odf_element
     """
     tag = native_element.tag
-    family = native_element.get("{%s}family" % ODF_NAMESPACES['style'])
-    cls, caching = __class_registry.get((tag, family), (None, None))
-    if cls is None and family is not None:
+    # Only look at the family when a class was registered for it
+    if tag in __family_tags:
+        family = native_element.get(_family_attribute)
+        cls, caching = __class_registry.get((tag, family), (None, None))
+        if cls is None and family is not None:
+            cls, caching = __class_registry.get((tag, None), (None, None))
+    else:
         cls, caching = __class_registry.get((tag, None), (None, None))
     if cls is None:
-        cls = odf_element
+        return odf_element(native_element)
     if caching:
         return cls(native_element, cache)
     else:
@@ -210,6 +404,20 @@ def _make_odf_element(native_element, cache=None):
 
 
 
+@lru_cache(maxsize=512)
+def _get_prototype(element_data):
+    """Parse the XML fragment (bytes) inside an empty document declaring all
+    the namespaces, once. The result is shared: copy it before use.
+    """
+    return fromstring(ns_document_data % element_data)
+
+
+
+# Empty root declaring all the namespaces, copied to hold the clones
+_clone_root = Element('ROOT', nsmap=ODF_NAMESPACES)
+
+
+
 def odf_create_element(element_data, cache=None):
     if type(element_data) is str:
         pass
@@ -223,16 +431,9 @@ def odf_create_element(element_data, cache=None):
         # Qualified name
         # XXX don't build the element from scratch or lxml will pollute with
         # repeated namespace declarations
-        if type(element_data) is str:
-            element_data = element_data.encode()
-        element_data = f'<{element_data.decode()}/>'
-    # XML fragment
-    if type(element_data) is str:
-        element_data = element_data.encode()
-    
-    t = element_data.decode()
-    data = ns_document_data % element_data
-    root = fromstring(data)
+        element_data = '<%s/>' % element_data
+    # XML fragment, parsed once then copied with its namespace declarations
+    root = deepcopy(_get_prototype(element_data.encode()))
     element = root[0]
     return _make_odf_element(element, cache)
 
@@ -278,6 +479,7 @@ class odf_element(object):
     """Representation of an XML element. Abstraction of the XML library
     behind.
     """
+    __slots__ = ('__element',)
 
     def __init__(self, native_element, cache=None):
         if not isinstance(native_element, _Element):
@@ -322,11 +524,9 @@ class odf_element(object):
         """
         current = self.__element
         element = element.__element
+        _before_change(current, element)
 
-        if main_text:
-            xpath_text = _xpath_text_main_descendant
-        else:
-            xpath_text = _xpath_text_descendant
+        texts = _iter_text(current, main_text)
 
         # 1) before xor after is not None
         if (before is not None) ^ (after is not None):
@@ -339,16 +539,16 @@ class odf_element(object):
             if position < 0:
                 # Found the last text that matches the regex
                 text = None
-                for a_text in xpath_text(current):
+                for a_parent, a_is_tail, a_text in texts:
                     if regex.search(a_text) is not None:
-                        text = a_text
+                        parent, is_tail, text = a_parent, a_is_tail, a_text
                 if text is None:
                     raise ValueError("text not found")
                 sre = list(regex.finditer(text))[-1]
             # position >= 0
             else:
                 count = 0
-                for text in xpath_text(current):
+                for parent, is_tail, text in texts:
                     found_nb = len(regex.findall(text))
                     if found_nb + count >= position + 1:
                         break
@@ -368,7 +568,7 @@ class odf_element(object):
 
             # Found the text
             count = 0
-            for text in xpath_text(current):
+            for parent, is_tail, text in texts:
                 found_nb = len(text)
                 if found_nb + count >= position:
                     break
@@ -386,8 +586,7 @@ class odf_element(object):
         text_after  = text[pos:] if text[pos:] else None
 
         # Insert!
-        parent = text.getparent()
-        if text.is_text:
+        if not is_tail:
             parent.text = text_before
             element.tail = text_after
             parent.insert(0, element)
@@ -437,19 +636,19 @@ class odf_element(object):
         """
         current = self.__element
         wrapper = element.__element
-        for text in _xpath_text_descendant(current):
+        _before_change(current, wrapper)
+        for from_container, is_tail, text in _iter_text(current):
             if not from_ in text:
                 continue
             from_index = text.index(from_)
             text_before = text[:from_index]
             text_after = text[from_index:]
-            from_container = text.getparent()
             # Include from_index to match a single word
             to_index = text.find(to, from_index)
             if to_index >= 0:
                 # Simple case: "from" and "to" in the same element
                 to_end = to_index + len(to)
-                if text.is_text:
+                if not is_tail:
                     from_container.text = text_before
                     wrapper.text = text[to_index:to_end]
                     wrapper.tail = text[to_end:]
@@ -469,7 +668,7 @@ class odf_element(object):
             raise ValueError("start text not found")
         # The container is split in two
         container2 = deepcopy(from_container)
-        if text.is_text:
+        if not is_tail:
             from_container.text = text_before
             from_container.tail = None
             container2.text = text_after
@@ -482,14 +681,13 @@ class odf_element(object):
         parent = from_container.getparent()
         index = parent.index(from_container)
         parent.insert(index + 1, wrapper)
-        for text in _xpath_text_descendant(wrapper):
+        for container_to, is_tail, text in _iter_text(wrapper):
             if not to in text:
                 continue
             to_end = text.index(to) + len(to)
             text_before = text[:to_end]
             text_after = text[to_end:]
-            container_to = text.getparent()
-            if text.is_text:
+            if not is_tail:
                 container_to.text = text_before
                 container_to.tail = text_after
             else:
@@ -514,7 +712,8 @@ class odf_element(object):
 
     def _set_tag_raw(self, qname):
         element = self.__element
-        element.tag = '{%s}%s' % _decode_qname(qname)
+        _before_change(element)
+        element.tag = _get_clark_name(qname)
 
     def set_tag(self, qname):
         """Change the tag name of the element with the given qualified name.
@@ -528,13 +727,12 @@ class odf_element(object):
         Return: odf_element or a subclass
         """
         element = self.__element
-        element.tag = '{%s}%s' % _decode_qname(qname)
+        _before_change(element)
+        element.tag = _get_clark_name(qname)
         return _make_odf_element(element)
 
     def elements_repeated_sequence(self, xpath_instance, name):
-        uri, name = _decode_qname(name)
-        if uri is not None:
-            name = '{%s}%s' % (uri, name)
+        name = _get_clark_name(name)
         element = self.__element
         sub_elements = xpath_instance(element)
         result = []
@@ -552,13 +750,49 @@ class odf_element(object):
             result.append((idx, max(value, 1)))
         return result
 
-    def get_elements(self, xpath_query):
+    def _children_repeated_sequences(self, *sequences):
+        """Split the children in sequences of elements, with how many times
+        each element is repeated.
+
+        Arguments:
+
+            sequences -- (tags, name) pairs: the qualified names of the
+                         elements of the sequence and of their repetition
+                         attribute
+
+        Return: a (list of lxml elements, list of int) pair by sequence
+        """
+        element = self.__element
+        result = []
+        for tags, name in sequences:
+            elements = list(element.iterchildren(*[_get_clark_name(tag)
+                                                   for tag in tags]))
+            # Reading every attribute from Python is slow, only read the
+            # ones that are set
+            query = '(%s)/@%s' % ('|'.join(tags), name)
+            repeated = {}
+            for attribute in _find_query_in_cache(query)(element):
+                try:
+                    value = int(attribute)
+                except ValueError:
+                    continue
+                if value > 1:
+                    repeated[attribute.getparent()] = value
+            if repeated:
+                repeats = [repeated.get(child, 1) for child in elements]
+            else:
+                repeats = [1] * len(elements)
+            result.append((elements, repeats))
+        return result
+
+
+    def get_elements(self, xpath_query, **variables):
         element = self.__element
         if isinstance(xpath_query, XPath):
-            result = xpath_query(element)
+            result = xpath_query(element, **variables)
         else:
             new_xpath_query = _find_query_in_cache(xpath_query)
-            result = new_xpath_query(element)
+            result = new_xpath_query(element, **variables)
         if hasattr(self, '_tmap'):
             if hasattr(self, '_rmap'):
                 cache = (self._tmap, self._cmap, self._rmap)
@@ -568,22 +802,67 @@ class odf_element(object):
             cache = None
         return [_make_odf_element(e, cache) for e in result]
 
+    def iter_elements(self, xpath_query, **variables):
+        """Iterate over the elements matching the XPath query, in document
+        order.
+
+        Plain paths like "descendant::text:p", optionally filtered on
+        attributes, are walked lazily so the caller can stop early. The tree
+        must not be changed while iterating.
+        """
+        if hasattr(self, '_tmap'):
+            if hasattr(self, '_rmap'):
+                cache = (self._tmap, self._cmap, self._rmap)
+            else:
+                cache = (self._tmap, self._cmap)
+        else:
+            cache = None
+        element = self.__element
+        elements = _iter_plain_path(element, xpath_query, variables)
+        if elements is None:
+            if isinstance(xpath_query, XPath):
+                elements = xpath_query(element, **variables)
+            else:
+                xpath_instance = _find_query_in_cache(xpath_query)
+                elements = xpath_instance(element, **variables)
+        for result in elements:
+            yield _make_odf_element(result, cache)
+
     # fixme : need original get_element as wrapper of get_elements
 
-    def get_element(self, xpath_query):
+    def get_element(self, xpath_query, position=0, **variables):
+        """Return the element at the given position among the results of the
+        XPath query, or None. Negative positions count from the end.
+
+        The search stops at the requested element: plain paths like
+        "descendant::text:p" are walked, other queries are compiled once
+        with the position.
+        """
         element = self.__element
-        result = element.xpath("(%s)[1]" % xpath_query, namespaces=ODF_NAMESPACES)
+        if position >= 0:
+            elements = _iter_plain_path(element, xpath_query, variables)
+            if elements is not None:
+                for result in islice(elements, position, None):
+                    return _make_odf_element(result)
+                return None
+        if position == 0:
+            query = _find_query_in_cache('(%s)[1]' % xpath_query)
+        elif position == -1:
+            query = _find_query_in_cache('(%s)[last()]' % xpath_query)
+        elif position > 0:
+            query = _find_query_in_cache('(%s)[$_position]' % xpath_query)
+            variables['_position'] = position + 1
+        else:
+            query = _find_query_in_cache('(%s)[last() - $_position]'
+                                         % xpath_query)
+            variables['_position'] = - position - 1
+        result = query(element, **variables)
         if result:
             return _make_odf_element(result[0])
         return None
 
     def _get_element_idx(self, xpath_query, idx):
-        element = self.__element
-        result = element.xpath("(%s)[%s]" % (xpath_query, idx+1),
-                               namespaces=ODF_NAMESPACES)
-        if result:
-            return _make_odf_element(result[0])
-        return None
+        return self.get_element(xpath_query, position=idx)
 
     def _get_element_idx2(self, xpath_instance, idx):
         element = self.__element
@@ -603,10 +882,7 @@ class odf_element(object):
 
     def get_attribute(self, name):
         element = self.__element
-        uri, name = _decode_qname(name)
-        if uri is not None:
-            name = '{%s}%s' % (uri, name)
-        value = element.get(name)
+        value = element.get(_get_clark_name(name))
         if value is None:
             return None
         elif value in ('true', 'false'):
@@ -616,9 +892,8 @@ class odf_element(object):
 
     def set_attribute(self, name, value):
         element = self.__element
-        uri, name = _decode_qname(name)
-        if uri is not None:
-            name = '{%s}%s' % (uri, name)
+        _before_change(element)
+        name = _get_clark_name(name)
         if type(value) is bool:
             value = Boolean.encode(value)
         elif value is None:
@@ -640,10 +915,8 @@ class odf_element(object):
 
     def del_attribute(self, name):
         element = self.__element
-        uri, name = _decode_qname(name)
-        if uri is not None:
-            name = '{%s}%s' % (uri, name)
-        del element.attrib[name]
+        _before_change(element)
+        del element.attrib[_get_clark_name(name)]
 
 
     def get_text(self, recursive=False):
@@ -662,6 +935,7 @@ class odf_element(object):
     def set_text(self, text):
         """Set the text content of the element.
         """
+        _before_change(self.__element)
         try:
             self.__element.text = text
         except TypeError:
@@ -684,6 +958,7 @@ class odf_element(object):
 
         Inspired by lxml.
         """
+        _before_change(self.__element)
         self.__element.tail = text
 
 
@@ -724,6 +999,23 @@ class odf_element(object):
         return self.search(pattern) is not None
 
 
+    def iter_text(self, main_text=False):
+        """Iterate over the text nodes of the element and its subtree, in
+        document order. Each text is given with the element holding it, as
+        its text or its tail.
+
+        If main_text is True, filter out the text directly in annotations.
+
+        Arguments:
+
+            main_text -- boolean
+
+        Return: iterator of (odf_element, is_tail, unicode) tuples
+        """
+        for element, is_tail, text in _iter_text(self.__element, main_text):
+            yield _make_odf_element(element), is_tail, text
+
+
     def replace(self, pattern, new=None):
         """Replace the pattern with the given text, or delete if text is an
         empty string, and return the number of replacements. By default, only
@@ -747,16 +1039,18 @@ class odf_element(object):
             pattern = str(pattern)
         cpattern = re.compile(pattern)
         count = 0
-        for text in self.xpath('descendant::text()'):
+        element = self.__element
+        if new is not None:
+            _before_change(element)
+        for container, is_tail, text in _iter_text(element):
             if new is None:
                 count += len(cpattern.findall(text))
             else:
                 new_text, number = cpattern.subn(new, text)
-                container = text.get_parent()
-                if text.is_text():
-                    container.set_text(new_text)
+                if is_tail:
+                    container.tail = new_text
                 else:
-                    container.set_tail(new_text)
+                    container.text = new_text
                 count += number
         return count
 
@@ -847,6 +1141,7 @@ class odf_element(object):
         # As "get_text_content" returned all text nodes, "set_text_content"
         # will overwrite all text nodes and children that may contain them
         element = paragraph.__element
+        _before_change(element)
         # Clear but the attributes
         del element[:]
         element.text = text
@@ -890,13 +1185,13 @@ class odf_element(object):
 
         def common_ancestor(t1, a1, v1, t2, a2, v2):
             root = self.get_root()
-            request1 = 'descendant::%s[@%s="%s"]' % (t1, a1, v1)
-            request2 = 'descendant::%s[@%s="%s"]' % (t2, a2, v2)
-            up = root.xpath(request1)[0]
+            request1 = 'descendant::%s[@%s=$value]' % (t1, a1)
+            request2 = 'descendant::%s[@%s=$value]' % (t2, a2)
+            up = root.xpath(request1, value=v1)[0]
             while True:
                 #print "up",
                 up = up.get_parent()
-                has_tag2 = up.xpath(request2)
+                has_tag2 = up.xpath(request2, value=v2)
                 if not has_tag2:
                     continue
                 #print 'found'
@@ -1042,6 +1337,38 @@ class odf_element(object):
             return inner
 
 
+    @contextmanager
+    def batch(self):
+        """Group many changes to the element and its subtree. The caches
+        derived from the tree, like the rows and columns of a table, are
+        rebuilt once when leaving the block instead of after each change:
+
+            with table.batch():
+                for row in rows:
+                    table.append_row(row)
+
+        Inside the block, the caches of the element may be out of date.
+        """
+        _before_change(self.__element)
+        self._begin_batch()
+        try:
+            yield self
+        finally:
+            self._end_batch()
+
+
+    def _begin_batch(self):
+        """Called when entering a batch, for subclasses keeping caches.
+        """
+        pass
+
+
+    def _end_batch(self):
+        """Called when leaving a batch, for subclasses keeping caches.
+        """
+        pass
+
+
     def insert(self, element, xmlposition=None, position=None, start=False):
         """Insert an element relatively to ourself.
 
@@ -1064,6 +1391,7 @@ class odf_element(object):
         child_tag = element.get_tag()
         current = self.__element
         element = element.__element
+        _before_change(current, element)
         if start:
             text = current.text
             if text is not None:
@@ -1082,13 +1410,9 @@ class odf_element(object):
         elif xmlposition is LAST_CHILD:
             current.append(element)
         elif xmlposition is NEXT_SIBLING:
-            parent = current.getparent()
-            index = parent.index(current)
-            parent.insert(index + 1, element)
+            current.addnext(element)
         elif xmlposition is PREV_SIBLING:
-            parent = current.getparent()
-            index = parent.index(current)
-            parent.insert(index, element)
+            current.addprevious(element)
         else:
             raise ValueError("(xml)position must be defined")
 
@@ -1099,6 +1423,7 @@ class odf_element(object):
         if odf_elements:
             current = self.__element
             elements = [ element.__element for element in odf_elements]
+            _before_change(current, *elements)
             current.extend(elements)
 
 
@@ -1106,6 +1431,10 @@ class odf_element(object):
         """Insert element or text in the last position.
         """
         current = self.__element
+        if isinstance(unicode_or_element, odf_element):
+            _before_change(current, unicode_or_element.__element)
+        else:
+            _before_change(current)
 
         # Unicode ?
         if isinstance(unicode_or_element, str):
@@ -1152,6 +1481,7 @@ class odf_element(object):
             child = self
         else:
             parent = self
+        _before_change(parent.__element)
         if keep_tail and child.__element.tail is not None:
             current = child.__element
             tail = current.tail
@@ -1177,6 +1507,7 @@ class odf_element(object):
         Warning : no clone for old element.
         """
         current = self.__element
+        _before_change(current, new_element.__element)
         current.replace(old_element.__element, new_element.__element)
 
 
@@ -1289,13 +1620,16 @@ class odf_element(object):
         return (element, True)
 
 
-    def xpath(self, xpath_query):
+    def xpath(self, xpath_query, **variables):
         """Apply XPath query to the element and its subtree. Return list of
         odf_element or odf_text instances translated from the nodes found.
+
+        Values referenced in the query as "$name" are given as keyword
+        arguments.
         """
         element = self.__element
         xpath_instance = _find_query_in_cache(xpath_query)
-        elements = xpath_instance(element)
+        elements = xpath_instance(element, **variables)
         result = []
         for obj in elements:
             if isinstance(obj, _ElementUnicodeResult):
@@ -1310,43 +1644,26 @@ class odf_element(object):
     def clear(self):
         """Remove text, children and attributes from the element.
         """
+        _before_change(self.__element)
         self.__element.clear()
-        if hasattr(self, '_tmap'):
-            self._tmap = []
-        if hasattr(self, '_cmap'):
-            self._cmap = []
-        if hasattr(self, '_rmap'):
-            self._rmap = []
-        if hasattr(self, '_indexes'):
-            remember = False
-            if '_rmap' in self._indexes:
-                remember = True
-            self._indexes = {}
-            self._indexes['_cmap'] = {}
-            self._indexes['_tmap'] = {}
-            if remember:
-                self._indexes['_rmap'] = {}
 
 
     def clone(self):
         clone = deepcopy(self.__element)
         # Now the clone is its own root and lxml lost unused namespace
         # prefixes.
-        # Re-attach it to a root with all namespaces
-        root = Element('ROOT', nsmap=ODF_NAMESPACES)
+        # Re-attach it to a root with all namespaces, copying an empty one
+        # is much cheaper than declaring them again
+        root = deepcopy(_clone_root)
         root.append(clone)
-        if hasattr(self, '_tmap'):
-            if hasattr(self, '_rmap'):
-                return self.__class__(clone, (self._tmap[:], self._cmap[:],
-                                              self._rmap[:]))
-            else:
-                return self.__class__(clone, (self._tmap[:], self._cmap[:]))
         return self.__class__(clone)
 
 
     def serialize(self, pretty=False, with_ns=False):
-        # This copy bypasses serialization side-effects in lxml
-        element = deepcopy(self.__element)
+        element = self.__element
+        if with_ns:
+            # The copy only declares the namespaces in use
+            element = deepcopy(element)
         data = tostring(element, with_tail=False,
                 pretty_print=pretty)
         data = data.decode('utf-8')
@@ -1517,6 +1834,17 @@ class odf_element(object):
                 content=content)
 
 
+    def iter_sections(self, style=None, content=None):
+        """Iterate over the sections that match the criteria, in document
+        order, without building the list first. See "get_sections" for the
+        arguments.
+
+        Return: iterator of odf_element
+        """
+        return _iter_elements(self, 'text:section', text_style=style,
+                content=content)
+
+
     def get_section(self, position=0, content=None):
         """Return the section that matches the criteria.
 
@@ -1551,6 +1879,17 @@ class odf_element(object):
                 content=content)
 
 
+    def iter_paragraphs(self, style=None, content=None):
+        """Iterate over the paragraphs that match the criteria, in document
+        order, without building the list first. See "get_paragraphs" for the
+        arguments.
+
+        Return: iterator of odf_paragraph
+        """
+        return _iter_elements(self, 'descendant::text:p', text_style=style,
+                content=content)
+
+
     def get_paragraph(self, position=0, content=None):
         """Return the paragraph that matches the criteria.
 
@@ -1585,6 +1924,16 @@ class odf_element(object):
                 content=content)
 
 
+    def iter_spans(self, style=None, content=None):
+        """Iterate over the spans that match the criteria, in document order,
+        without building the list first. See "get_spans" for the arguments.
+
+        Return: iterator of odf_span
+        """
+        return _iter_elements(self, 'descendant::text:span', text_style=style,
+                content=content)
+
+
     def get_span(self, position=0, content=None):
         """Return the span that matches the criteria.
 
@@ -1619,6 +1968,17 @@ class odf_element(object):
                 outline_level=outline_level, content=content)
 
 
+    def iter_headings(self, style=None, outline_level=None, content=None):
+        """Iterate over the headings that match the criteria, in document
+        order, without building the list first. See "get_headings" for the
+        arguments.
+
+        Return: iterator of odf_heading
+        """
+        return _iter_elements(self, 'descendant::text:h', text_style=style,
+                outline_level=outline_level, content=content)
+
+
     def get_heading(self, position=0, outline_level=None, content=None):
         """Return the heading that matches the criteria.
 
@@ -1653,6 +2013,16 @@ class odf_element(object):
                 content=content)
 
 
+    def iter_lists(self, style=None, content=None):
+        """Iterate over the lists that match the criteria, in document order,
+        without building the list first. See "get_lists" for the arguments.
+
+        Return: iterator of odf_list
+        """
+        return _iter_elements(self, 'descendant::text:list', text_style=style,
+                content=content)
+
+
     def get_list(self, position=0, content=None):
         """Return the list that matches the criteria.
 
@@ -1693,6 +2063,18 @@ class odf_element(object):
                 svg_title=title, svg_desc=description, content=content)
 
 
+    def iter_frames(self, presentation_class=None, style=None, title=None,
+            description=None, content=None):
+        """Iterate over the frames that match the criteria, in document order,
+        without building the list first. See "get_frames" for the arguments.
+
+        Return: iterator of odf_frame
+        """
+        return _iter_elements(self, 'descendant::draw:frame',
+                presentation_class=presentation_class, draw_style=style,
+                svg_title=title, svg_desc=description, content=content)
+
+
     def get_frame(self, position=0, name=None,
             presentation_class=None, title=None, description=None,
             content=None):
@@ -1736,6 +2118,16 @@ class odf_element(object):
                 url=url, content=content)
 
 
+    def iter_images(self, style=None, url=None, content=None):
+        """Iterate over the images that match the criteria, in document order,
+        without building the list first. See "get_images" for the arguments.
+
+        Return: iterator of odf_element
+        """
+        return _iter_elements(self, 'descendant::draw:image', text_style=style,
+                url=url, content=content)
+
+
     def get_image(self, position=0, name=None, url=None, content=None):
         """Return the image that matches the criteria.
 
@@ -1778,6 +2170,16 @@ class odf_element(object):
                 table_style=style, content=content)
 
 
+    def iter_tables(self, style=None, content=None):
+        """Iterate over the tables that match the criteria, in document order,
+        without building the list first. See "get_tables" for the arguments.
+
+        Return: iterator of odf_table
+        """
+        return _iter_elements(self, 'descendant::table:table',
+                table_style=style, content=content)
+
+
     def get_table(self, position=0, name=None, content=None):
         """Return the table that matches the criteria.
 
@@ -1822,7 +2224,8 @@ class odf_element(object):
         Return: odf_named_range
         """
         named_range = self.get_elements(
-        'descendant::table:named-expressions/table:named-range[@table:name="%s"][1]' % name)
+        'descendant::table:named-expressions/table:named-range[@table:name=$name][1]',
+            name=name)
         if named_range:
             return named_range[0]
         else:
@@ -1846,7 +2249,7 @@ class odf_element(object):
             self.append(named_expressions)
         # exists ?
         current = named_expressions.get_element(
-            'table:named-range[@table:name="%s"][1]' % named_range.name)
+            'table:named-range[@table:name=$name][1]', name=named_range.name)
         if current:
             named_expressions.delete(current)
         named_expressions.append(named_range)
@@ -1891,6 +2294,16 @@ class odf_element(object):
                 note_class=note_class, content=content)
 
 
+    def iter_notes(self, note_class=None, content=None):
+        """Iterate over the notes that match the criteria, in document order,
+        without building the list first. See "get_notes" for the arguments.
+
+        Return: iterator of odf_note
+        """
+        return _iter_elements(self, 'descendant::text:note',
+                note_class=note_class, content=content)
+
+
     def get_note(self, position=0, note_id=None, note_class=None,
             content=None):
         """Return the note that matches the criteria.
@@ -2212,6 +2625,17 @@ class odf_element(object):
                 content=content)
 
 
+    def iter_draw_pages(self, style=None, content=None):
+        """Iterate over the draw pages that match the criteria, in document
+        order, without building the list first. See "get_draw_pages" for the
+        arguments.
+
+        Return: iterator of odf_draw_page
+        """
+        return _iter_elements(self, 'descendant::draw:page', draw_style=style,
+                content=content)
+
+
     def get_draw_page(self, position=0, name=None, content=None):
         """Return the draw page that matches the criteria.
 
@@ -2252,6 +2676,16 @@ class odf_element(object):
                 office_title=title, url=url, content=content)
 
 
+    def iter_links(self, name=None, title=None, url=None, content=None):
+        """Iterate over the links that match the criteria, in document order,
+        without building the list first. See "get_links" for the arguments.
+
+        Return: iterator of odf_element
+        """
+        return _iter_elements(self, 'descendant::text:a', office_name=name,
+                office_title=title, url=url, content=content)
+
+
     def get_link(self, position=0, name=None, title=None, url=None,
             content=None):
         """Return the link that matches the criteria.
@@ -2459,11 +2893,9 @@ class odf_element(object):
         Return: odf_element or None if not found
         """
         if name:
-            request = ('descendant::text:reference-mark-start[@text:name="%s"] '
-                   '| descendant::text:reference-mark[@text:name="%s"]') % (
-                                                                    name, name)
-
-            return _get_element(self, request, position=0)
+            request = ('descendant::text:reference-mark-start[@text:name=$name] '
+                   '| descendant::text:reference-mark[@text:name=$name]')
+            return self.get_element(request, name=name)
         else:
             request = ('descendant::text:reference-mark-start '
                    '| descendant::text:reference-mark')
@@ -2482,8 +2914,8 @@ class odf_element(object):
         """
         if name is None:
             return _get_elements(self, 'descendant::text:reference-ref')
-        request = 'descendant::text:reference-ref[@text:ref-name="%s"]' % name
-        return _get_elements(self, request)
+        request = 'descendant::text:reference-ref[@text:ref-name=$name]'
+        return self.get_elements(request, name=name)
 
 
     #
@@ -2807,9 +3239,9 @@ class odf_element(object):
         Return: odf_element or None if not found
         """
         if idx:
-            request = ('descendant::text:change-start[@text:change-id="%s"] '
-            '| descendant::text:change[@text:change-id="%s"]') % (idx, idx)
-            return _get_element(self, request, position=0)
+            request = ('descendant::text:change-start[@text:change-id=$idx] '
+            '| descendant::text:change[@text:change-id=$idx]')
+            return self.get_element(request, idx=idx)
         else:
             request = ('descendant::text:change-start '
                    '| descendant::text:change')
@@ -222,6 +222,7 @@ def odf_create_frame_position_style(name="FramePosition",
 
 
 class odf_frame(odf_element):
+    __slots__ = ()
 
     def get_name(self):
         return self.get_attribute('draw:name')
@@ -86,6 +86,8 @@ def odf_create_list(text=[], style=None):
 class odf_list(odf_element):
     """Specialised element for lists.
     """
+    __slots__ = ()
+
     def get_style(self):
         return self.get_attribute('text:style-name')
 
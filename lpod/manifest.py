@@ -75,9 +75,9 @@ class odf_manifest(odf_xmlpart):
 
         Return: str
         """
-        expr = ('//manifest:file-entry[attribute::manifest:full-path="%s"]'
+        expr = ('//manifest:file-entry[attribute::manifest:full-path=$path]'
                 '/attribute::manifest:media-type')
-        result = self.xpath(expr % full_path)
+        result = self.xpath(expr, path=full_path)
         if not result:
             return None
         return result[0]
@@ -92,8 +92,8 @@ class odf_manifest(odf_xmlpart):
 
             media_type -- str
         """
-        expr = '//manifest:file-entry[attribute::manifest:full-path="%s"]'
-        result = self.xpath(expr % full_path)
+        expr = '//manifest:file-entry[attribute::manifest:full-path=$path]'
+        result = self.xpath(expr, path=full_path)
         if not result:
             raise KeyError('path "%s" not found' % full_path)
         file_entry = result[0]
@@ -111,8 +111,8 @@ class odf_manifest(odf_xmlpart):
 
 
     def del_full_path(self, full_path):
-        expr = '//manifest:file-entry[attribute::manifest:full-path="%s"]'
-        result = self.xpath(expr % full_path)
+        expr = '//manifest:file-entry[attribute::manifest:full-path=$path]'
+        result = self.xpath(expr, path=full_path)
         if not result:
             raise KeyError('path "%s" not found' % full_path)
         file_entry = result[0]
@@ -152,6 +152,7 @@ def odf_create_annotation_end(annotation=None, name=None):
 
 
 class odf_note(odf_element):
+    __slots__ = ()
 
     def get_class(self):
         return self.get_attribute('text:note-class')
@@ -213,6 +214,7 @@ class odf_note(odf_element):
 
 
 class odf_annotation(odf_element):
+    __slots__ = ()
 
     def get_body(self):
         return self.get_text_content()
@@ -332,6 +334,8 @@ class odf_annotation_end(odf_element):
     element without a preceding <office:annotation> element that has the same
     name assigned is ignored.
     """
+    __slots__ = ()
+
     def get_name(self):
         return self.get_attribute('office:name')
 
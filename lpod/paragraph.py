@@ -118,7 +118,8 @@ def _by_regex_offset(method):
         if offset:
             length = kwargs.get('length', 0)
             counted = 0
-            for text in element.xpath("//text()"):
+            # All the text of the document, as "//text()"
+            for container, is_tail, text in element.get_root().iter_text():
                 if len(text) + counted <= offset:
                     counted += len(text)
                     continue
@@ -127,9 +128,8 @@ def _by_regex_offset(method):
                 else:
                     length = len(text)
                 # Static information about the text node
-                container = text.get_parent()
                 upper = container.get_parent()
-                is_text = text.is_text()
+                is_text = not is_tail
                 start = offset - counted
                 end = start + length
                 # Do not use the text node as it changes at each loop
@@ -153,11 +153,11 @@ def _by_regex_offset(method):
                 return
         if regex:
             pattern = re.compile(str(regex), re.UNICODE)
-            for text in element.xpath('descendant::text()'):
+            # The tree changes in the loop, list the text nodes first
+            for container, is_tail, text in list(element.iter_text()):
                 # Static information about the text node
-                container = text.get_parent()
                 upper = container.get_parent()
-                is_text = text.is_text()
+                is_text = not is_tail
                 # Group positions are calculated and static, so apply in
                 # reverse order to preserve positions
                 for group in reversed(list(pattern.finditer(text))):
@@ -189,6 +189,7 @@ class odf_paragraph(paragraph_base):
     represents a paragraph, which is the basic unit of text in an OpenDocument
     file.
     """
+    __slots__ = ()
 
     def insert_note(self, note_element=None, after=None,
                     note_class='footnote', note_id=None, citation=None,
@@ -720,7 +721,7 @@ class odf_paragraph(paragraph_base):
 
 
 class odf_span(odf_paragraph):
-    pass
+    __slots__ = ()
 
 
 
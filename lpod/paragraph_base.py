@@ -227,6 +227,8 @@ def odf_create_line_break():
 class paragraph_base(odf_element):
     """Base class for paragraph like classes.
     """
+    __slots__ = ()
+
     def get_style(self):
         return self.get_attribute('text:style-name')
 
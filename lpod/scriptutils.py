@@ -82,8 +82,7 @@ def printinfo(*args, **kw):
     indent = kw.get('indent', 0)
     if indent:
         stderr.write(' ' * indent)
-    encoding = stderr.encoding if stderr.encoding is not None else 'utf-8'
-    output = ' '.join(arg.encode(encoding) for arg in args)
+    output = ' '.join(args)
     stderr.write(output)
     stderr.write("\n")
 
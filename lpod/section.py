@@ -49,6 +49,7 @@ def odf_create_section(style=None):
 class odf_section(odf_element):
     """Specialised element for sections.
     """
+    __slots__ = ()
 
     def get_style(self):
         return self.get_attribute('text:style-name')
@@ -204,6 +204,7 @@ def odf_create_connector(style=None, text_style=None, shape_id=None,
 
 
 class odf_shape(odf_element):
+    __slots__ = ()
 
     def get_id(self):
         return self.get_attribute('draw:id')
@@ -308,6 +309,7 @@ class odf_shape(odf_element):
 
 # XXX better place?
 class draw_group(odf_element):
+    __slots__ = ()
 
     def get_name(self):
         return self.get_attribute('draw:name')
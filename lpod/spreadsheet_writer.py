@@ -0,0 +1,392 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2009-2010 Ars Aperta, Itaapy, Pierlis, Talend.
+#
+# This file is part of Lpod (see: http://lpod-project.net).
+# Lpod is free software; you can redistribute it and/or modify it under
+# the terms of either:
+#
+# a) the GNU General Public License as published by the Free Software
+#    Foundation, either version 3 of the License, or (at your option)
+#    any later version.
+#    Lpod is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#    You should have received a copy of the GNU General Public License
+#    along with Lpod.  If not, see <http://www.gnu.org/licenses/>.
+#
+# b) the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+
+# Import from the Standard Library
+from os import chmod, close, remove, replace, umask
+from os.path import abspath, dirname
+from queue import Queue, Full
+from tempfile import mkstemp
+from threading import Thread
+from uuid import uuid4
+from xml.sax.saxutils import quoteattr
+
+# Import from lxml
+from lxml.etree import fromstring
+
+# Import from lpod
+from .const import ODF_CONTENT
+from .document import odf_new_document
+from .element import odf_create_element, _make_odf_element, PREV_SIBLING
+from .table import _append_cells_data, _array_to_list
+
+
+# Size of the chunks of content.xml given to the compressor
+_CHUNK_SIZE = 64 * 1024
+# Chunks waiting for the compressor, to bound the memory used
+_QUEUE_SIZE = 16
+# Values formatted by odf_create_cell kept for the next rows
+_CACHE_SIZE = 1024
+
+# Told to the thread saving the document
+_END = None
+_ABORT = object()
+
+
+
+class odf_spreadsheet_writer(object):
+    """Write a spreadsheet document row by row, in constant memory: the
+    rows are not kept in a tree but go into content.xml as they come, and
+    the Zip file is written at the same time, by another thread.
+
+    Styles, metadata and other parts come from the template. Styles used
+    by the rows must be inserted in "writer.document" before the first
+    sheet is added.
+
+    Use "close" when done, or the writer as a context manager::
+
+        >>> with odf_spreadsheet_writer('export.ods') as writer:
+        ...     sheet = writer.add_sheet('Data')
+        ...     for values in rows:
+        ...         sheet.write_row(values)
+    """
+
+    def __init__(self, target, template='spreadsheet'):
+        """
+        Arguments:
+
+            target -- str or file-like object
+
+            template -- str or file-like object, see odf_new_document
+        """
+        self.document = odf_new_document(template)
+        self.target = target
+        # A path is written under a temporary name, until closed
+        self.__temp = None
+        self.__sheet = None
+        self.__footer = None
+        self.__queue = None
+        self.__thread = None
+        self.__error = None
+        self.__buffer = []
+        self.__buffered = 0
+        self.__closed = False
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.__abort()
+
+
+    def __start(self):
+        """Split the content of the template around the place of the sheets,
+        then save the document with content.xml made from the rows.
+        """
+        # A copy of its own, declaring the namespaces of the template
+        content = self.document.get_part(ODF_CONTENT)
+        root = _make_odf_element(fromstring(content.serialize().encode()))
+        body = root.get_document_body()
+        tables = body.get_elements('table:table')
+        marker = odf_create_element('table:table')
+        marker.set_attribute('table:name', str(uuid4()))
+        if tables:
+            tables[0].insert(marker, xmlposition=PREV_SIBLING)
+            for table in tables:
+                body.delete(table)
+        else:
+            body.append(marker)
+        data = root.serialize(with_ns=True)
+        header, footer = data.split(marker.serialize())
+        self.__footer = footer.encode('utf-8')
+        self.__queue = Queue(_QUEUE_SIZE)
+        self.__queue.put(b'<?xml version="1.0" encoding="UTF-8"?>\n'
+                         + header.encode('utf-8'))
+        self.document.set_part(ODF_CONTENT, self.__write_content)
+        if type(self.target) is str:
+            fd, self.__temp = mkstemp(suffix='.tmp',
+                                      dir=dirname(abspath(self.target)))
+            close(fd)
+        self.__thread = Thread(target=self.__save)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+
+    def __save(self):
+        try:
+            self.document.save(self.__temp or self.target)
+        except BaseException as error:
+            self.__error = error
+
+
+    def __write_content(self, file):
+        """Write content.xml to the file as the chunks come.
+        """
+        queue = self.__queue
+        while True:
+            chunk = queue.get()
+            if chunk is _END:
+                break
+            elif chunk is _ABORT:
+                raise IOError('spreadsheet writer aborted')
+            file.write(chunk)
+        file.write(self.__footer)
+
+
+    def __put(self, chunk):
+        """Give the chunk to the thread saving the document, unless it failed.
+        """
+        thread = self.__thread
+        while True:
+            try:
+                self.__queue.put(chunk, timeout=0.1)
+                return
+            except Full:
+                if not thread.is_alive():
+                    self.__check()
+
+
+    def __check(self):
+        if self.__error is not None:
+            raise self.__error
+        if self.__thread is not None and not self.__thread.is_alive():
+            raise IOError('spreadsheet writer stopped')
+
+
+    def _write(self, data):
+        """Buffer the data of content.xml, given by the sheets.
+        """
+        self.__check()
+        self.__buffer.append(data)
+        self.__buffered += len(data)
+        if self.__buffered >= _CHUNK_SIZE:
+            self.__flush()
+
+
+    def __flush(self):
+        if self.__buffer:
+            data = ''.join(self.__buffer)
+            self.__buffer = []
+            self.__buffered = 0
+            self.__put(data.encode('utf-8'))
+
+
+    def __abort(self):
+        if self.__closed:
+            return
+        self.__closed = True
+        thread = self.__thread
+        if thread is not None:
+            # Unless the thread stopped meanwhile, with the queue full
+            while thread.is_alive():
+                try:
+                    self.__queue.put(_ABORT, timeout=0.1)
+                    break
+                except Full:
+                    pass
+            thread.join()
+        self.__remove_temp()
+
+
+    def __remove_temp(self):
+        if self.__temp is not None:
+            try:
+                remove(self.__temp)
+            except OSError:
+                pass
+            self.__temp = None
+
+
+    #
+    # Public API
+    #
+
+    def add_sheet(self, name, style=None, width=None):
+        """Start a new sheet, the rows of the previous one are all written.
+
+        The sheet has as many columns as "width", or as cells in the first
+        row. The columns are written before the rows, so give the width when
+        rows are not all as long: longer rows are refused.
+
+        Arguments:
+
+            name -- unicode
+
+            style -- unicode
+
+            width -- int
+
+        Return: odf_sheet_writer
+        """
+        if self.__closed:
+            raise ValueError('spreadsheet writer is closed')
+        if self.__sheet is not None:
+            self.__sheet.close()
+        if self.__thread is None:
+            self.__start()
+        self.__check()
+        self.__sheet = odf_sheet_writer(self._write, name, style=style,
+                                        width=width)
+        return self.__sheet
+
+
+    def close(self):
+        """Write the last rows and the rest of the document.
+        """
+        if self.__closed:
+            return
+        try:
+            if self.__sheet is not None:
+                self.__sheet.close()
+            if self.__thread is None:
+                self.__start()
+            self.__flush()
+            self.__put(_END)
+        except BaseException:
+            # Nothing left behind
+            self.__abort()
+            raise
+        self.__closed = True
+        self.__thread.join()
+        if self.__error is not None:
+            self.__remove_temp()
+            raise self.__error
+        temp = self.__temp
+        if temp is not None:
+            # mkstemp only let us read and write it
+            mask = umask(0)
+            umask(mask)
+            chmod(temp, 0o666 & ~mask)
+            replace(temp, self.target)
+            self.__temp = None
+
+
+
+class odf_sheet_writer(object):
+    """A sheet of odf_spreadsheet_writer, written row by row. Identical
+    rows in a row are written once, repeated.
+    """
+
+    def __init__(self, write, name, style=None, width=None):
+        self.__write = write
+        self.name = name
+        self.style = style
+        self.width = width
+        self.__row = None
+        self.__repeated = 0
+        self.__started = False
+        self.__closed = False
+        self.__caches = {}
+
+
+    def __start(self, width):
+        self.width = width
+        style = self.style
+        self.__write('<table:table table:name=%s%s>' % (quoteattr(self.name),
+            '' if style is None else ' table:style-name=%s' % quoteattr(style)))
+        self.__write('<table:table-column%s/>' % (
+            ' table:number-columns-repeated="%d"' % width
+            if width > 1 else ''))
+        self.__started = True
+
+
+    def __write_row(self):
+        repeated = self.__repeated
+        if not repeated:
+            return
+        if repeated > 1:
+            self.__write('<table:table-row table:number-rows-repeated="%d">'
+                         % repeated)
+        else:
+            self.__write('<table:table-row>')
+        self.__write(self.__row)
+        self.__write('</table:table-row>')
+
+
+    def write_row(self, values, style=None, cell_type=None, currency=None):
+        """Write the row of the given values, like odf_table.set_values
+        would do. None values create empty cells with no cell type (but
+        eventually a style).
+
+        The row can't have more values than the width of the sheet.
+
+        Arguments:
+
+            values -- list of Python types, or any iterable
+
+            style -- unicode, the style of the cells
+
+            cell_type -- 'boolean', 'currency', 'date', 'float', 'percentage',
+                         'string' or 'time'
+
+            currency -- three-letter str
+        """
+        if self.__closed:
+            raise ValueError('sheet "%s" is closed' % self.name)
+        if hasattr(values, 'tolist'):
+            values = _array_to_list(values)
+        elif not isinstance(values, (list, tuple)):
+            values = list(values)
+        if not self.__started:
+            self.__start(self.width or len(values) or 1)
+        if len(values) > self.width:
+            raise ValueError('%d values for %d columns in sheet "%s"' % (
+                len(values), self.width, self.name))
+        key = (style, cell_type, currency)
+        cache = self.__caches.get(key)
+        if cache is None or len(cache) > _CACHE_SIZE:
+            cache = self.__caches[key] = {}
+        if style is not None:
+            style = ' table:style-name=%s' % quoteattr(style)
+        else:
+            style = ''
+        data = []
+        _append_cells_data(data, values, style, cell_type, currency, cache)
+        if not data:
+            data.append('<table:table-cell/>')
+        row = ''.join(data)
+        if row == self.__row:
+            self.__repeated += 1
+            return
+        self.__write_row()
+        self.__row = row
+        self.__repeated = 1
+
+
+    def close(self):
+        """Write the last rows of the sheet. Done when adding another sheet
+        or closing the writer.
+        """
+        if self.__closed:
+            return
+        if not self.__started:
+            self.__start(self.width or 1)
+        self.__write_row()
+        self.__write('</table:table>')
+        self.__row = None
+        self.__closed = True
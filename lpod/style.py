@@ -580,6 +580,8 @@ def odf_create_style(family, name=None, display_name=None, parent=None,
 class odf_style(odf_element):
     """Specialised element for styles, yet generic to all style types.
     """
+    __slots__ = ()
+
     def get_name(self):
         return self.get_attribute('style:name')
 
@@ -799,6 +801,8 @@ class odf_style(odf_element):
 class odf_list_style(odf_style):
     """A list style is a container for list level styles.
     """
+    __slots__ = ()
+
     any_style = ('(text:list-level-style-number'
                  '|text:list-level-style-bullet'
                  '|text:list-level-style-image)')
@@ -894,6 +898,7 @@ class odf_list_style(odf_style):
 
 
 class odf_outline_style(odf_list_style):
+    __slots__ = ()
 
     # FIXME stubs
     def get_family(self):
@@ -906,6 +911,8 @@ class odf_page_layout(odf_style):
 
     XXX to verify
     """
+    __slots__ = ()
+
     def get_family(self):
         return 'page-layout'
 
@@ -944,6 +951,8 @@ class odf_master_page(odf_style):
 
     XXX to verify
     """
+    __slots__ = ()
+
     def __set_header_or_footer(self, text_or_element, name='header',
                                style="Header"):
         if name == 'header':
@@ -1047,6 +1056,7 @@ class odf_master_page(odf_style):
 
 
 class odf_font_style(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'font-face'
@@ -1065,6 +1075,7 @@ class odf_font_style(odf_style):
 
 
 class odf_number_style(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'number'
@@ -1072,6 +1083,7 @@ class odf_number_style(odf_style):
 
 
 class odf_percentage_style(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'percentage'
@@ -1079,6 +1091,7 @@ class odf_percentage_style(odf_style):
 
 
 class odf_time_style(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'time'
@@ -1086,6 +1099,7 @@ class odf_time_style(odf_style):
 
 
 class odf_date_style(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'date'
@@ -1093,6 +1107,7 @@ class odf_date_style(odf_style):
 
 
 class odf_currency_style(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'currency'
@@ -1100,6 +1115,7 @@ class odf_currency_style(odf_style):
 
 
 class odf_presentation_page_layout(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'presentation-page-layout'
@@ -1107,6 +1123,7 @@ class odf_presentation_page_layout(odf_style):
 
 
 class odf_list_level_style_number(odf_style):
+    __slots__ = ()
 
     def get_text_style(self):
         return self.get_attribute('text:style-name')
@@ -1118,6 +1135,7 @@ class odf_list_level_style_number(odf_style):
 
 
 class odf_marker(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'marker'
@@ -1125,6 +1143,7 @@ class odf_marker(odf_style):
 
 
 class odf_background_image(odf_image):
+    __slots__ = ()
 
     def get_position(self):
         return self.get_attribute('style:position')
@@ -1160,6 +1179,7 @@ class odf_background_image(odf_image):
 
 
 class odf_fill_image(odf_style, odf_image):
+    __slots__ = ()
 
     def get_family(self):
         return 'fill-image'
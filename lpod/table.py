@@ -28,20 +28,241 @@
 #
 
 # Import from the Standard Library
+from copy import deepcopy
 from io import StringIO
 from csv import reader, Sniffer
 from textwrap import wrap
-from bisect import bisect_left, insort
+from xml.sax.saxutils import escape, quoteattr
 import string
+try:
+    import numpy
+except ImportError:
+    # No odf_table.to_array
+    numpy = None
+
+# Import from lxml
+from lxml.etree import fromstring
 
 # Import from lpod
 from .datatype import Boolean, Date, DateTime, Duration
 from .element import odf_create_element, register_element_class, odf_element
-from .element import _xpath_compile
+from .element import NEXT_SIBLING, PREV_SIBLING
+from .element import _xpath_compile, _make_odf_element, _get_clark_name
+from .element import _before_change, ns_document_data
 from .utils import get_value, _set_value_and_type, isiterable   #, obsolete
 
 
 
+# Value types in odf_table.to_array
+_ARRAY_EMPTY, _ARRAY_FLOAT, _ARRAY_BOOLEAN, _ARRAY_DATE, _ARRAY_TIME, \
+        _ARRAY_STRING = list(range(6))
+_array_types = {'float': _ARRAY_FLOAT, 'percentage': _ARRAY_FLOAT,
+                'currency': _ARRAY_FLOAT, 'boolean': _ARRAY_BOOLEAN,
+                'date': _ARRAY_DATE, 'time': _ARRAY_TIME,
+                'string': _ARRAY_STRING}
+_clark_cell = _get_clark_name('table:table-cell')
+_clark_covered_cell = _get_clark_name('table:covered-table-cell')
+_clark_paragraph = _get_clark_name('text:p')
+_clark_cells_repeated = _get_clark_name('table:number-columns-repeated')
+_clark_rows_repeated = _get_clark_name('table:number-rows-repeated')
+_clark_value_type = _get_clark_name('office:value-type')
+_clark_value = _get_clark_name('office:value')
+_clark_boolean_value = _get_clark_name('office:boolean-value')
+_clark_date_value = _get_clark_name('office:date-value')
+_clark_time_value = _get_clark_name('office:time-value')
+_clark_string_value = _get_clark_name('office:string-value')
+
+
+
+def _get_array_value(cell, code):
+    """Read the value of the lxml cell as stored by odf_table.to_array:
+    a float for numbers and booleans, the string of the attribute for dates
+    and times, the text for strings.
+    """
+    if code == _ARRAY_FLOAT:
+        return float(cell.get(_clark_value))
+    elif code == _ARRAY_BOOLEAN:
+        return 1.0 if cell.get(_clark_boolean_value) == 'true' else 0.0
+    elif code == _ARRAY_DATE:
+        return cell.get(_clark_date_value)
+    elif code == _ARRAY_TIME:
+        return cell.get(_clark_time_value)
+    value = cell.get(_clark_string_value)
+    if value is not None:
+        return value
+    paragraphs = ([''.join(paragraph.itertext())
+                   for paragraph in cell.iterchildren(_clark_paragraph)])
+    if not paragraphs:
+        return None
+    return '\n'.join(paragraphs)
+
+
+
+def _make_array_column(codes, numbers, others):
+    """Build the typed column of odf_table.to_array from the codes, numbers
+    and other values of its cells.
+
+    Return: (numpy.ndarray, empty mask) pair
+    """
+    mask = codes == _ARRAY_EMPTY
+    found = set(numpy.unique(codes).tolist())
+    found.discard(_ARRAY_EMPTY)
+    if not found or found == {_ARRAY_FLOAT}:
+        return numpy.where(mask, numpy.nan, numbers), mask
+    elif found == {_ARRAY_BOOLEAN}:
+        return numbers.astype(bool), mask
+    elif found == {_ARRAY_DATE}:
+        return numpy.where(mask, 'NaT', others).astype('datetime64[us]'), mask
+    elif found == {_ARRAY_TIME}:
+        values = [None if value is None else Duration.decode(value)
+                  for value in others]
+        return numpy.array(values, dtype='timedelta64[us]'), mask
+    # Strings and mixed types, the Python values of get_value
+    values = []
+    for code, number, other in zip(codes.tolist(), numbers.tolist(),
+                                   others.tolist()):
+        if code == _ARRAY_FLOAT:
+            values.append(number)
+        elif code == _ARRAY_BOOLEAN:
+            values.append(bool(number))
+        elif code == _ARRAY_DATE:
+            if 'T' in other:
+                values.append(DateTime.decode(other))
+            else:
+                values.append(Date.decode(other))
+        elif code == _ARRAY_TIME:
+            values.append(Duration.decode(other))
+        else:
+            values.append(other)
+    column = numpy.empty(len(values), dtype=object)
+    column[:] = values
+    return column, mask
+
+
+
+def _get_cell_data(value, style, cell_type, currency, cache):
+    """Serialize the cell of the given value for odf_table.from_array, as
+    odf_create_cell would make it. Numbers and strings are formatted
+    directly, other values are made once by odf_create_cell and cached.
+
+    Return: str
+    """
+    kind = value.__class__
+    if cell_type is None:
+        if kind is float or kind is int:
+            value = str(value)
+            return ('<table:table-cell office:value-type="float" '
+                    'office:value="%s"%s><text:p>%s</text:p>'
+                    '</table:table-cell>' % (value, style, value))
+        elif kind is str:
+            return ('<table:table-cell office:value-type="string" '
+                    'office:string-value=%s%s><text:p>%s</text:p>'
+                    '</table:table-cell>' % (
+                        quoteattr(value, {'\n': '&#10;', '\t': '&#9;',
+                                          '\r': '&#13;'}),
+                        style, escape(value, {'\r': '&#13;'})))
+    key = (kind, value)
+    data = cache.get(key)
+    if data is None:
+        cell = odf_create_cell(value, cell_type=cell_type, currency=currency)
+        data = cell.serialize()
+        if style:
+            # After the value, as set_style would put it
+            end = -2 if data.endswith('/>') else data.index('>')
+            data = data[:end] + style + data[end:]
+        cache[key] = data
+    return data
+
+
+
+def _array_to_list(values):
+    """Turn a NumPy array (or anything with "tolist") into Python values.
+    Dates and durations finer than the microsecond would be given as ints,
+    they are cut to the microsecond first.
+    """
+    dtype = getattr(values, 'dtype', None)
+    if dtype is not None and dtype.kind in 'Mm':
+        unit = dtype.str[dtype.str.find('[') + 1:-1]
+        if unit in ('ns', 'ps', 'fs', 'as'):
+            values = values.astype('%s8[us]' % dtype.kind)
+    return values.tolist()
+
+
+def _append_cells_data(data, values, style, cell_type, currency, cache):
+    """Append to the "data" list the XML of the cells of the given values,
+    runs of equal values in repeated cells. See "_get_cell_data" for the
+    other arguments.
+    """
+    previous = previous_kind = None
+    repeated = 0
+    for value in values:
+        kind = value.__class__
+        if kind is float and value != value:
+            # NaN
+            value = None
+            kind = None.__class__
+        if repeated and kind is previous_kind and value == previous:
+            repeated += 1
+            continue
+        if repeated:
+            _append_cell_data(data, previous, repeated, style, cell_type,
+                              currency, cache)
+        previous = value
+        previous_kind = kind
+        repeated = 1
+    if repeated:
+        _append_cell_data(data, previous, repeated, style, cell_type,
+                          currency, cache)
+
+
+
+def _append_cell_data(data, value, repeated, style, cell_type, currency,
+                      cache):
+    cell = _get_cell_data(value, style, cell_type, currency, cache)
+    if repeated > 1:
+        # After "<table:table-cell"
+        cell = '<table:table-cell table:number-columns-repeated="%d"%s' % (
+                repeated, cell[17:])
+    data.append(cell)
+
+
+def _copy_row_cells(row, start, end):
+    """Copy the lxml cells of the lxml row that are before "start" and
+    after "end", repetitions cut at the limits.
+
+    Return: (list of cells, list of cells, int) the cells before, the cells
+            after and the width of the row
+    """
+    before = []
+    after = []
+    position = 0
+    for cell in row.iterchildren(_clark_cell, _clark_covered_cell):
+        repeated = cell.get(_clark_cells_repeated)
+        begin = position
+        position += int(repeated) if repeated else 1
+        if begin < start:
+            copy = deepcopy(cell)
+            copy.tail = None
+            _set_native_repeated(copy, _clark_cells_repeated,
+                                 min(position, start) - begin)
+            before.append(copy)
+        if position > end:
+            copy = deepcopy(cell)
+            copy.tail = None
+            _set_native_repeated(copy, _clark_cells_repeated,
+                                 position - max(begin, end))
+            after.append(copy)
+    return before, after, position
+
+
+
+def _set_native_repeated(element, name, repeated):
+    if repeated > 1:
+        element.set(name, str(repeated))
+    elif name in element.attrib:
+        del element.attrib[name]
+
+
 _xpath_row = _xpath_compile('table:table-row')
 _xpath_row_idx = _xpath_compile('(table:table-row)[$idx]')
 _xpath_column = _xpath_compile('table:table-column')
@@ -217,6 +438,302 @@ def _get_python_value(data, encoding):
 
 
 
+def _fenwick_build(values):
+    """Build a Fenwick tree (binary indexed tree) of the values.
+    """
+    tree = [0]
+    tree.extend(values)
+    size = len(tree)
+    for i in range(1, size):
+        j = i + (i & -i)
+        if j < size:
+            tree[j] += tree[i]
+    return tree
+
+
+
+def _fenwick_add(tree, i, delta):
+    """Add delta to the value at index i.
+    """
+    i += 1
+    size = len(tree)
+    while i < size:
+        tree[i] += delta
+        i += i & -i
+
+
+
+def _fenwick_sum(tree, i):
+    """Sum of the values before index i.
+    """
+    result = 0
+    while i > 0:
+        result += tree[i]
+        i -= i & -i
+    return result
+
+
+
+def _fenwick_find(tree, value):
+    """Find the first index where the sum of the values up to it (included)
+    is greater than value. Return the index and the sum of the values
+    before it.
+    """
+    i = 0
+    rest = value
+    size = len(tree)
+    step = 1 << (size.bit_length() - 1)
+    while step:
+        j = i + step
+        if j < size and tree[j] <= rest:
+            i = j
+            rest -= tree[j]
+        step >>= 1
+    return i, value - rest
+
+
+
+class _position_map(object):
+    """The map of the items (cells, rows or columns) of a row or table, in
+    ODF order, with the number of positions they are repeated on.
+
+    Behaves like the sorted list of the last position of each item, e.g.
+    [2, 3, 6] for a cell repeated 3 times, a cell and a cell repeated 3
+    times. Finding, inserting or erasing an item, or changing its
+    repetition, takes logarithmic time: the items are split in blocks
+    indexed by Fenwick trees of their number of items and positions.
+
+    The element of each item is remembered when known, so it is not looked
+    up again in the XML tree: the lxml element found when building the map,
+    then its odf_element.
+    """
+    __slots__ = ('_repeats', '_items', '_counts', '_sizes', '_len', '_total')
+
+    # Number of items in a block, split beyond twice
+    _load = 64
+
+
+    def __init__(self, repeats=(), items=None):
+        repeats = list(repeats)
+        if items is None:
+            items = [None] * len(repeats)
+        load = self._load
+        self._repeats = [repeats[i:i + load]
+                         for i in range(0, len(repeats), load)]
+        self._items = [items[i:i + load]
+                       for i in range(0, len(items), load)]
+        self._len = len(repeats)
+        self._total = sum(repeats)
+        self._index()
+
+
+    def _index(self):
+        self._counts = _fenwick_build([len(block)
+                                       for block in self._repeats])
+        self._sizes = _fenwick_build([sum(block) for block in self._repeats])
+
+
+    def _locate(self, odf_idx):
+        """Return the block and index in the block of the item.
+        """
+        if odf_idx < 0:
+            odf_idx += self._len
+        if not 0 <= odf_idx < self._len:
+            raise IndexError(odf_idx)
+        block, before = _fenwick_find(self._counts, odf_idx)
+        return block, odf_idx - before
+
+
+    def __len__(self):
+        return self._len
+
+
+    def __iter__(self):
+        # Position of the last repetition of each item
+        position = -1
+        for block in self._repeats:
+            for repeated in block:
+                position += repeated
+                yield position
+
+
+    def __getitem__(self, odf_idx):
+        if isinstance(odf_idx, slice):
+            return list(self)[odf_idx]
+        if odf_idx == -1 and self._len:
+            return self._total - 1
+        block, i = self._locate(odf_idx)
+        return (_fenwick_sum(self._sizes, block)
+                + sum(self._repeats[block][:i + 1]) - 1)
+
+
+    def __repr__(self):
+        return '<_position_map %r>' % list(self)
+
+
+    def copy(self):
+        """Copy the map, without the elements.
+        """
+        return _position_map(repeated for block in self._repeats
+                                      for repeated in block)
+
+
+    def find(self, position):
+        """Find the index of the item at the given position, or None if
+        outside the map.
+        """
+        if position >= self._total:
+            return None
+        position = max(position, 0)
+        block, before = _fenwick_find(self._sizes, position)
+        position -= before
+        i = 0
+        for repeated in self._repeats[block]:
+            position -= repeated
+            if position < 0:
+                break
+            i += 1
+        return _fenwick_sum(self._counts, block) + i
+
+
+    def get_repeated(self, odf_idx):
+        block, i = self._locate(odf_idx)
+        return self._repeats[block][i]
+
+
+    def set_repeated(self, odf_idx, repeated):
+        block, i = self._locate(odf_idx)
+        repeated = repeated or 1
+        delta = repeated - self._repeats[block][i]
+        self._repeats[block][i] = repeated
+        _fenwick_add(self._sizes, block, delta)
+        self._total += delta
+
+
+    def get_item(self, odf_idx):
+        block, i = self._locate(odf_idx)
+        return self._items[block][i]
+
+
+    def set_item(self, odf_idx, item):
+        block, i = self._locate(odf_idx)
+        self._items[block][i] = item
+
+
+    def insert(self, odf_idx, repeated, item=None):
+        """Insert an item before the given index, or at the end if the
+        index is the length of the map.
+
+            odf_idx  --  index in ODF XML
+
+            repeated  --  repeated value of item, 1 or more
+
+            item -- odf_element or None if unknown
+
+        odf_idx is NOT position (col or row), neither raw XML position, but
+        ODF index
+        """
+        repeated = repeated or 1
+        if not 0 <= odf_idx <= self._len:
+            raise IndexError(odf_idx)
+        if not self._repeats:
+            self._repeats.append([])
+            self._items.append([])
+            self._index()
+        if odf_idx == self._len:
+            block = len(self._repeats) - 1
+            i = len(self._repeats[block])
+        else:
+            block, i = self._locate(odf_idx)
+        repeats = self._repeats[block]
+        repeats.insert(i, repeated)
+        self._items[block].insert(i, item)
+        self._len += 1
+        self._total += repeated
+        if len(repeats) > 2 * self._load:
+            # Split the block in two
+            half = len(repeats) // 2
+            items = self._items[block]
+            self._repeats[block:block + 1] = [repeats[:half], repeats[half:]]
+            self._items[block:block + 1] = [items[:half], items[half:]]
+            self._index()
+        else:
+            _fenwick_add(self._counts, block, 1)
+            _fenwick_add(self._sizes, block, repeated)
+
+
+    def erase(self, odf_idx):
+        """Remove the item at the given index from the map.
+
+            odf_idx  --  index in ODF XML
+        """
+        block, i = self._locate(odf_idx)
+        repeated = self._repeats[block].pop(i)
+        self._items[block].pop(i)
+        self._len -= 1
+        self._total -= repeated
+        if not self._repeats[block]:
+            del self._repeats[block]
+            del self._items[block]
+            self._index()
+        else:
+            _fenwick_add(self._counts, block, -1)
+            _fenwick_add(self._sizes, block, -repeated)
+
+
+    def update(self, other):
+        """Replace the content of the map by the one of the other map, for
+        the elements sharing it.
+        """
+        self._repeats = [block[:] for block in other._repeats]
+        self._items = [block[:] for block in other._items]
+        self._len = other._len
+        self._total = other._total
+        self._index()
+
+
+    def clear_items(self):
+        """Forget the elements of the items.
+        """
+        self._items = [[None] * len(block) for block in self._repeats]
+
+
+
+def _get_item_in_vault(odf_idx, vault, vault_scheme, vault_map):
+    """Get the item (cell, row, column) of the vault (row, table) at the
+    given ODF index, looking it up in the XML tree only once.
+    """
+    item = vault_map.get_item(odf_idx)
+    if item is None:
+        item = vault._get_element_idx2(vault_scheme, odf_idx)
+        vault_map.set_item(odf_idx, item)
+    elif not isinstance(item, odf_element):
+        # Found when building the map
+        item = _make_odf_element(item)
+        vault_map.set_item(odf_idx, item)
+    return item
+
+
+
+def _delete_overlapped_items(odf_idx, deleting, vault, vault_scheme,
+                             vault_map):
+    """Remove the given number of positions from the items starting at
+    odf_idx, deleting or reducing their repetition.
+    """
+    while deleting > 0 and odf_idx < len(vault_map):
+        delete_item = _get_item_in_vault(odf_idx, vault, vault_scheme,
+                                          vault_map)
+        is_repeated = vault_map.get_repeated(odf_idx) - deleting
+        if is_repeated >= 1:
+            delete_item._set_repeated(is_repeated)
+            vault_map.set_repeated(odf_idx, is_repeated)
+            return
+        vault.delete(delete_item)
+        vault_map.erase(odf_idx)
+        deleting = -is_repeated
+
+
+
 def _set_item_in_vault(position, item, vault, vault_scheme, vault_map_name, clone=True):
     """Set the item (cell, row) in its vault (row, table), updating the
        cache map.
@@ -227,76 +744,42 @@ def _set_item_in_vault(position, item, vault, vault_scheme, vault_map_name, clon
         raise ValueError
     odf_idx = _find_odf_idx(vault_map, position)
     repeated = item.get_repeated() or 1
+    current_item = _get_item_in_vault(odf_idx, vault, vault_scheme,
+                                       vault_map)
     current_cache = vault_map[odf_idx]
-    cache = vault._indexes[vault_map_name]
-    if odf_idx in cache:
-        current_item = cache[odf_idx]
-    else:
-        current_item = vault._get_element_idx2(vault_scheme, odf_idx)
-    vault._indexes[vault_map_name] = {}
-    target_idx = vault.index(current_item)
-    if odf_idx > 0:
-        before_cache = vault_map[odf_idx - 1]
-    else:
-        before_cache = -1
-    current_pos = before_cache + 1
-    current_repeated = current_cache - before_cache
+    current_repeated = vault_map.get_repeated(odf_idx)
+    current_pos = current_cache - current_repeated + 1
     repeated_before = position - current_pos
     repeated_after = current_repeated - repeated_before - repeated
+    if clone:
+        new_item = item.clone()
+    else:
+        new_item = item
+    # Insert new element, next to the current one
     if repeated_before >= 1:
         #Update repetition
         current_item._set_repeated(repeated_before)
-        target_idx += 1
+        current_item.insert(new_item, xmlposition=NEXT_SIBLING)
+        vault_map.set_repeated(odf_idx, repeated_before)
+        odf_idx += 1
+        vault_map.insert(odf_idx, repeated, new_item)
     else:
         # Replacing the first occurence
+        current_item.insert(new_item, xmlposition=PREV_SIBLING)
         vault.delete(current_item)
-    # Insert new element
-    if clone:
-        new_item = item.clone()
-    else:
-        new_item = item
-    vault.insert(new_item, position = target_idx)
+        vault_map.erase(odf_idx)
+        vault_map.insert(odf_idx, repeated, new_item)
     # Insert the remaining repetitions
     if repeated_after >= 1:
         after_item = current_item.clone()
         after_item._set_repeated(repeated_after)
-        vault.insert(after_item, position = target_idx + 1)
+        new_item.insert(after_item, xmlposition=NEXT_SIBLING)
+        vault_map.insert(odf_idx + 1, repeated_after, after_item)
     # setting a repeated item !
-    if repeated_after < 0:
+    elif repeated_after < 0:
         # deleting some overlapped items
-        deleting = repeated_after
-        while deleting < 0:
-            delete_item = vault._get_element_idx2(vault_scheme, target_idx + 1)
-            if delete_item is None:
-                break
-            is_repeated = delete_item.get_repeated() or 1
-            is_repeated += deleting
-            if is_repeated > 1:
-                delete_item._set_repeated(is_repeated)
-            else:
-                vault.delete(delete_item)
-            deleting = is_repeated
-    # update cache
-    # remove existing
-    idx = odf_idx
-    map = _erase_map_once(vault_map, idx)
-    # add before if any:
-    if repeated_before >= 1:
-        map = _insert_map_once(map, idx, repeated_before)
-        idx += 1
-    # add our slot
-    map = _insert_map_once(map, idx, repeated)
-    # add after if any::
-    if repeated_after >= 1:
-        idx += 1
-        map = _insert_map_once(map, idx, repeated_after)
-    if repeated_after < 0:
-        idx += 1
-        while repeated_after < 0:
-            if idx < len(map):
-                map = _erase_map_once(map, idx)
-            repeated_after += 1
-    setattr(vault, vault_map_name, map)
+        _delete_overlapped_items(odf_idx + 1, -repeated_after, vault,
+                                 vault_scheme, vault_map)
     return new_item
 
 
@@ -308,40 +791,28 @@ def _insert_item_in_vault(position, item, vault, vault_scheme, vault_map_name):
         raise ValueError
     odf_idx = _find_odf_idx(vault_map, position)
     repeated = item.get_repeated() or 1
+    current_item = _get_item_in_vault(odf_idx, vault, vault_scheme,
+                                       vault_map)
     current_cache = vault_map[odf_idx]
-    cache = vault._indexes[vault_map_name]
-    if odf_idx in cache:
-        current_item = cache[odf_idx]
-    else:
-        current_item = vault._get_element_idx2(vault_scheme, odf_idx)
-    vault._indexes[vault_map_name] = {}
-    target_idx = vault.index(current_item)
-    if odf_idx > 0:
-        before_cache = vault_map[odf_idx - 1]
-    else:
-        before_cache = -1
-    current_pos = before_cache + 1
-    current_repeated = current_cache - before_cache
+    current_repeated = vault_map.get_repeated(odf_idx)
+    current_pos = current_cache - current_repeated + 1
     repeated_before = position - current_pos
     repeated_after = current_repeated - repeated_before
     new_item = item.clone()
     if repeated_before >= 1:
         current_item._set_repeated(repeated_before)
-        vault.insert(new_item, position = target_idx + 1)
+        current_item.insert(new_item, xmlposition=NEXT_SIBLING)
         after_item = current_item.clone()
         after_item._set_repeated(repeated_after)
-        vault.insert(after_item, position = target_idx + 2)
+        new_item.insert(after_item, xmlposition=NEXT_SIBLING)
+        # update cache
+        vault_map.set_repeated(odf_idx, repeated_before)
+        vault_map.insert(odf_idx + 1, repeated, new_item)
+        vault_map.insert(odf_idx + 2, repeated_after, after_item)
     else:
         # only insert new cell
-        vault.insert(new_item, position = target_idx)
-    # update cache
-    if repeated_before >= 1:
-        map = _erase_map_once(vault_map, odf_idx)
-        map = _insert_map_once(map, odf_idx, repeated_before)
-        map = _insert_map_once(map, odf_idx + 1, repeated)
-        setattr(vault, vault_map_name, _insert_map_once(map, odf_idx + 2, repeated_after))
-    else:
-        setattr(vault, vault_map_name, _insert_map_once(vault_map, odf_idx, repeated))
+        current_item.insert(new_item, xmlposition=PREV_SIBLING)
+        vault_map.insert(odf_idx, repeated, new_item)
     return new_item
 
 
@@ -352,96 +823,23 @@ def _delete_item_in_vault(position, vault, vault_scheme, vault_map_name):
     except:
         raise ValueError
     odf_idx = _find_odf_idx(vault_map, position)
-    current_cache = vault_map[odf_idx]
-    cache = vault._indexes[vault_map_name]
-    if odf_idx in cache:
-        current_item = cache[odf_idx]
-    else:
-        current_item = vault._get_element_idx2(vault_scheme, odf_idx)
-    vault._indexes[vault_map_name] = {}
-    if odf_idx > 0:
-        before_cache = vault_map[odf_idx - 1]
-    else:
-        before_cache = -1
-    current_pos = before_cache + 1
-    current_repeated = current_cache - before_cache
-    new_repeated = current_repeated - 1
+    current_item = _get_item_in_vault(odf_idx, vault, vault_scheme,
+                                       vault_map)
+    new_repeated = vault_map.get_repeated(odf_idx) - 1
     if new_repeated >= 1:
         current_item._set_repeated(new_repeated)
-        setattr(vault, vault_map_name, vault_map[:odf_idx] + [(x - 1) for x in vault_map[odf_idx:]] )
+        vault_map.set_repeated(odf_idx, new_repeated)
     else:
         # actual erase
         vault.delete(current_item)
-        setattr(vault, vault_map_name, vault_map[:odf_idx] + [(x - 1) for x in vault_map[odf_idx + 1:]] )
-
-
-
-def _insert_map_once(map, odf_idx, repeated):
-    """Add an item (cell or row) to the map
-
-            map  --  cache map
-
-            odf_idx  --  index in ODF XML
-
-            repeated  --  repeated value of item, 1 or more
-
-        odf_idx is NOT position (col or row), neither raw XML position, but ODF index
-    """
-    repeated = repeated or 1
-    if odf_idx > len(map):
-        raise IndexError
-    if odf_idx > 0 :
-        before = map[odf_idx - 1]
-    else:
-        before = -1
-    juska = before + repeated # aka max position value for item
-    if odf_idx == len(map):
-        insort(map, juska)
-        return map
-    new_map = map[:odf_idx]
-    new_map.append(juska)
-    new_map.extend([(x + repeated) for x in map[odf_idx:]])
-    return new_map
-
-
-
-def _erase_map_once(map, odf_idx):
-    """Remove an item (cell or row) from the map
-
-            map  --  cache map
-
-            odf_idx  --  index in ODF XML
-    """
-    if odf_idx >= len(map):
-        raise IndexError
-    if odf_idx > 0 :
-        before = map[odf_idx - 1]
-    else:
-        before = -1
-    current = map[odf_idx]
-    repeated = current - before
-    map = map[:odf_idx] + [(x - repeated) for x in map[odf_idx + 1:]]
-    return map
-
-
-
-def _make_cache_map(idx_repeated_seq):
-    """Build the initial cache map of the table.
-    """
-    map = []
-    for odf_idx, repeated in idx_repeated_seq:
-        map = _insert_map_once(map, odf_idx, repeated)
-    return map
+        vault_map.erase(odf_idx)
 
 
 
 def _find_odf_idx(map, position):
     """Find odf_idx in the map from the position (col or row).
     """
-    odf_idx = bisect_left(map, position)
-    if odf_idx < len(map):
-        return odf_idx
-    return None
+    return map.find(position)
 
 
 
@@ -673,6 +1071,7 @@ def odf_create_named_range(name, crange, table_name, usage=None):
 class odf_cell(odf_element):
     """Class for the table cell element.
     """
+    __slots__ = ('x', 'y')
 
     def __init__(self, native_element):
         odf_element.__init__(self, native_element)
@@ -884,20 +1283,26 @@ class odf_cell(odf_element):
 
 
 class odf_row(odf_element):
+    __slots__ = ('y', '_tmap', '_cmap', '_rmap', '_batched')
 
     # Private API
     def __init__(self, native_element, cache=None):
         odf_element.__init__(self, native_element, cache)
         self.y = None
-        # parse the whole table for repeated cells, if cache not already provided
-        if not hasattr(self, '_rmap'):
+        if cache is None:
+            self._tmap = _position_map()
+            self._cmap = _position_map()
+        # the cache of repeated cells is computed on first use, if not
+        # already provided
+        self._batched = 0
+
+
+    def __getattr__(self, name):
+        if name == '_rmap':
             self._compute_row_cache()
-            if not hasattr(self, '_tmap'):
-                self._tmap = []
-                self._cmap = []
-        if not hasattr(self, '_indexes'):
-            self._indexes={}
-            self._indexes['_rmap'] = {}
+            return self._rmap
+        raise AttributeError("'%s' object has no attribute '%s'" % (
+            type(self).__name__, name))
 
 
     _append = odf_element.append
@@ -928,9 +1333,18 @@ class odf_row(odf_element):
         return (x, z)
 
 
+    def clear(self):
+        odf_element.clear(self)
+        self._tmap = _position_map()
+        self._cmap = _position_map()
+        self._rmap = _position_map()
+
+
     def _compute_row_cache(self):
-        idx_repeated_seq = self.elements_repeated_sequence(_xpath_cell, 'table:number-columns-repeated')
-        self._rmap = _make_cache_map(idx_repeated_seq)
+        (cells, repeats), = self._children_repeated_sequences(
+                (('table:table-cell', 'table:covered-table-cell'),
+                 'table:number-columns-repeated'))
+        self._rmap = _position_map(repeats, cells)
 
 
     # Public API
@@ -938,6 +1352,12 @@ class odf_row(odf_element):
     def clone(self):
         clone = odf_element.clone(self)
         clone.y = self.y
+        # The clone is out of the table, only copy the cache of its cells if
+        # already computed
+        try:
+            clone._rmap = object.__getattribute__(self, '_rmap').copy()
+        except AttributeError:
+            pass
         return clone
 
 
@@ -994,9 +1414,9 @@ class odf_row(odf_element):
         # fixme : need to optimize this
         if isinstance(upper, odf_table):
             upper._compute_table_cache()
+            # The map is shared with the table and its other rows
             if hasattr(self, '_tmap'):
-                del self._tmap[:]
-                self._tmap.extend(upper._tmap)
+                self._tmap.update(upper._tmap)
             else:
                 self._tmap = upper._tmap
 
@@ -1034,7 +1454,7 @@ class odf_row(odf_element):
         return w
 
 
-    def traverse(self, start=None, end=None):
+    def traverse(self, start=None, end=None, clone=True):
         """Yield as many cell elements as expected cells in the row, i.e.
         expand repetitions by returning the same cell as many times as
         necessary.
@@ -1045,7 +1465,11 @@ class odf_row(odf_element):
 
                 end -- int
 
-        Copies are returned, use ``set_cell`` to push them back.
+                clone -- bool
+
+        Copies are returned, use ``set_cell`` to push them back. Without
+        clone, the cells of the row are returned as they are, repetition
+        included, for reading only.
         """
         idx = -1
         before = -1
@@ -1053,18 +1477,14 @@ class odf_row(odf_element):
         if start is None and end is None:
             for juska in self._rmap:
                 idx += 1
-                if idx in self._indexes['_rmap']:
-                    cell = self._indexes['_rmap'][idx]
-                else:
-                    cell = self._get_element_idx2(_xpath_cell_idx, idx)
-                    self._indexes['_rmap'][idx] = cell
+                cell = _get_item_in_vault(idx, self, _xpath_cell_idx, self._rmap)
                 repeated = juska - before
                 before = juska
                 for i in range(repeated or 1):
                     # Return a copy without the now obsolete repetition
                     if cell is None:
                         cell = odf_create_cell()
-                    else:
+                    elif clone:
                         cell = cell.clone()
                         if repeated > 1:
                             cell.set_repeated(None)
@@ -1091,18 +1511,14 @@ class odf_row(odf_element):
             x = start
             for juska in self._rmap[start_map:]:
                 idx += 1
-                if idx in self._indexes['_rmap']:
-                    cell = self._indexes['_rmap'][idx]
-                else:
-                    cell = self._get_element_idx2(_xpath_cell_idx, idx)
-                    self._indexes['_rmap'][idx] = cell
+                cell = _get_item_in_vault(idx, self, _xpath_cell_idx, self._rmap)
                 repeated = juska - before
                 before = juska
                 for i in range(repeated or 1):
                     if x <= end:
                         if cell is None:
                             cell = odf_create_cell()
-                        else:
+                        elif clone:
                             cell = cell.clone()
                             if repeated > 1 or (x == start and start > 0):
                                 cell.set_repeated(None)
@@ -1168,16 +1584,12 @@ class odf_row(odf_element):
         if clone:
             return self._get_cell2_base(x).clone()
         else:
-            return self._get_cell2_base(x).clone()
+            return self._get_cell2_base(x)
 
     def _get_cell2_base(self, x):
         idx = _find_odf_idx(self._rmap, x)
         if idx is not None:
-            if idx in self._indexes['_rmap']:
-                cell = self._indexes['_rmap'][idx]
-            else:
-                cell = self._get_element_idx2(_xpath_cell_idx, idx)
-                self._indexes['_rmap'][idx] = cell
+            cell = _get_item_in_vault(idx, self, _xpath_cell_idx, self._rmap)
             return cell
         return None
 
@@ -1185,12 +1597,15 @@ class odf_row(odf_element):
         """Get the cell at position "x" starting from 0. Alphabetical
         positions like "D" are accepted.
 
-        A  copy is returned, use ``set_cell`` to push it back.
+        A  copy is returned, use ``set_cell`` to push it back. Without
+        clone, the cell of the row is returned, for reading only.
 
         Arguments:
 
             x -- int or str
 
+            clone -- bool
+
         Return: odf_cell
         """
         x = self._translate_x_from_any(x)
@@ -1314,9 +1729,20 @@ class odf_row(odf_element):
         return cell_back
 
 
+    def _begin_batch(self):
+        self._batched += 1
+
+
+    def _end_batch(self):
+        self._batched -= 1
+        if not self._batched:
+            self._compute_row_cache()
+
+
     def extend_cells(self, cells=[]):
         self.extend(cells)
-        self._compute_row_cache()
+        if not self._batched:
+            self._compute_row_cache()
 
 
     def append_cell(self, cell=None, clone=True, _repeated=None):
@@ -1338,10 +1764,12 @@ class odf_row(odf_element):
             clone = False
         if clone:
             cell = cell.clone()
+        # Compute the cache, if not yet, before the change
+        rmap = self._rmap
         self._append(cell)
         if _repeated is None:
             _repeated = cell.get_repeated() or 1
-        self._rmap = _insert_map_once(self._rmap, len(self._rmap), _repeated)
+        rmap.insert(len(rmap), _repeated, cell)
         cell.x = self.get_width() - 1
         cell.y = self.y
         return cell
@@ -1408,7 +1836,7 @@ class odf_row(odf_element):
         if cell_type:
             cell_type = cell_type.lower().strip()
             values = []
-            for cell in self.traverse(start = x, end = z):
+            for cell in self.traverse(start=x, end=z, clone=False):
                 # Filter the cells by cell_type
                 ctype = cell.get_type()
                 if not ctype or not (ctype == cell_type or cell_type == 'all'):
@@ -1422,7 +1850,7 @@ class odf_row(odf_element):
             return values
         else:
             return [ cell.get_value(get_type = get_type)
-                                for cell in self.traverse(start = x, end = z) ]
+                     for cell in self.traverse(start=x, end=z, clone=False) ]
 
 
     def set_cells(self, cells=[], start=0, clone=True):
@@ -1503,7 +1931,6 @@ class odf_row(odf_element):
                 break
             self.delete(cell)
         self._compute_row_cache()
-        self._indexes['_rmap'] = {}
 
 
     def is_empty(self, aggressive=False):
@@ -1528,12 +1955,14 @@ class odf_row(odf_element):
 class odf_row_group(odf_element):
     """Class to group rows with common properties.
     """
+    __slots__ = ()
+
     # TODO
-    pass
 
 
 
 class odf_column(odf_element):
+    __slots__ = ('x', '_cmap')
 
     def __init__(self, native_element, cache=None):
         odf_element.__init__(self, native_element, cache)
@@ -1607,9 +2036,9 @@ class odf_column(odf_element):
         # fixme : need to optimize this
         if isinstance(upper, odf_table):
             upper._compute_table_cache()
+            # The map is shared with the table and its other columns
             if hasattr(self, '_cmap'):
-                del self._cmap[:]
-                self._cmap.extend(upper._cmap)
+                self._cmap.update(upper._cmap)
             else:
                 self._cmap = upper._cmap
 
@@ -1634,17 +2063,24 @@ class odf_column(odf_element):
 
 
 class odf_table(odf_element):
+    __slots__ = ('_tmap', '_cmap', '_batched')
+
     #
     # Private API
     #
     def __init__(self, native_element, cache=None):
         odf_element.__init__(self, native_element, cache)
-        # parse the whole table for repeated rows, if cache not already provided
-        if cache is None:
+        # the cache of repeated rows and columns is computed on first use, if
+        # not already provided
+        self._batched = 0
+
+
+    def __getattr__(self, name):
+        if name in ('_tmap', '_cmap'):
             self._compute_table_cache()
-        self._indexes={}
-        self._indexes['_cmap'] = {}
-        self._indexes['_tmap'] = {}
+            return getattr(self, name)
+        raise AttributeError("'%s' object has no attribute '%s'" % (
+            type(self).__name__, name))
 
 
     _append = odf_element.append
@@ -1790,11 +2226,20 @@ class odf_table(odf_element):
         return (x, y)
 
 
+    def clear(self):
+        odf_element.clear(self)
+        self._tmap = _position_map()
+        self._cmap = _position_map()
+
+
     def _compute_table_cache(self):
-        idx_repeated_seq = self.elements_repeated_sequence(_xpath_row, 'table:number-rows-repeated')
-        self._tmap = _make_cache_map(idx_repeated_seq)
-        idx_repeated_seq = self.elements_repeated_sequence(_xpath_column, 'table:number-columns-repeated')
-        self._cmap = _make_cache_map(idx_repeated_seq)
+        # Rows and columns in one pass
+        (rows, rows_repeats), (columns, columns_repeats) = \
+                self._children_repeated_sequences(
+                (('table:table-row',), 'table:number-rows-repeated'),
+                (('table:table-column',), 'table:number-columns-repeated'))
+        self._tmap = _position_map(rows_repeats, rows)
+        self._cmap = _position_map(columns_repeats, columns)
 
 
     def __update_width(self, row):
@@ -1807,10 +2252,33 @@ class odf_table(odf_element):
             self.append_column(odf_create_column(repeated=diff))
 
 
+    def __update_width_all(self):
+        """Synchronize the number of columns with the biggest row.
+        """
+        width = self.get_width()
+        # Repetitions don't matter, no need to traverse
+        for row in self._get_rows():
+            width = max(width, row.get_width())
+        diff = width - self.get_width()
+        if diff > 0:
+            self.append_column(odf_create_column(repeated=diff))
+
+
+    def _begin_batch(self):
+        self._batched += 1
+
+
+    def _end_batch(self):
+        self._batched -= 1
+        if not self._batched:
+            self._compute_table_cache()
+            self.__update_width_all()
+
+
     def __get_formatted_text_normal(self, context):
         result = []
-        for row in self.traverse():
-            for cell in row.traverse():
+        for row in self.traverse(clone=False):
+            for cell in row.traverse(clone=False):
                 value = get_value(cell, try_get_text=False)
                 # None ?
                 if value is None:
@@ -1837,9 +2305,9 @@ class odf_table(odf_element):
         rows = []
         cols_nb = 0
         cols_size = {}
-        for odf_row in table.traverse():
+        for odf_row in table.traverse(clone=False):
             row = []
-            for i, cell in enumerate(odf_row.traverse()):
+            for i, cell in enumerate(odf_row.traverse(clone=False)):
                 value = get_value(cell, try_get_text=False)
                 # None ?
                 if value is None:
@@ -1958,6 +2426,18 @@ class odf_table(odf_element):
     # Public API
     #
 
+    def clone(self):
+        clone = odf_element.clone(self)
+        # Only copy the caches already computed, the clone computes them on
+        # first use otherwise
+        try:
+            clone._tmap = object.__getattribute__(self, '_tmap').copy()
+            clone._cmap = object.__getattribute__(self, '_cmap').copy()
+        except AttributeError:
+            pass
+        return clone
+
+
     def append(self, something):
         """Dispatch .append() call to append_row() or append_column().
         """
@@ -2134,7 +2614,7 @@ class odf_table(odf_element):
         else:
             x = y = z = t = None
         data = []
-        for row in self.traverse(start = y, end = t):
+        for row in self.traverse(start=y, end=t, clone=False):
             if z is None:
                 width = self.get_width()
             else:
@@ -2184,7 +2664,7 @@ class odf_table(odf_element):
             x, y, z, t = self._translate_table_coordinates(coord)
         else:
             x = y = z = t = None
-        for row in self.traverse(start = y, end = t):
+        for row in self.traverse(start=y, end=t, clone=False):
             if z is None:
                 width = self.get_width()
             else:
@@ -2203,6 +2683,125 @@ class odf_table(odf_element):
             yield values
 
 
+    def to_array(self, coord=None):
+        """Get the values of the table as NumPy arrays, one by column.
+        Requires NumPy.
+
+        Made for big tables: the XML is read in one pass, without wrapping
+        the cells, and repeated rows and cells are expanded by NumPy.
+
+        The type of a column depends on the values found in it: float64 for
+        'float', 'percentage' and 'currency', bool for 'boolean', datetime64
+        for 'date', timedelta64 for 'time', else object for 'string' and
+        mixed columns. Empty cells are masked.
+
+        Filter by coordinates will parse the area defined by the coordinates.
+
+        Arguments:
+
+            coord -- str or tuple of int : coordinates of area
+
+        Return: list of numpy.ma.MaskedArray
+        """
+        if numpy is None:
+            raise ImportError('NumPy is required by to_array')
+        if coord:
+            x, y, z, t = self._translate_table_coordinates(coord)
+        else:
+            x = y = z = t = None
+        start = x or 0
+        if z is None:
+            width = max(self.get_width() - start, 0)
+        else:
+            width = max(min(z + 1, self.get_width()) - start, 0)
+        # The rows of the area, and how many times they are repeated
+        (elements, repeats), = self._children_repeated_sequences(
+                (('table:table-row',), 'table:number-rows-repeated'))
+        rows = []
+        row_repeats = []
+        position = 0
+        first = y or 0
+        for row, repeated in zip(elements, repeats):
+            end = position + repeated
+            if t is not None and end > t + 1:
+                end = t + 1
+            if end > first:
+                rows.append(row)
+                row_repeats.append(end - max(position, first))
+            position = end
+            if t is not None and position > t:
+                break
+        # The cells with a value: one run of repeated cells at a time
+        run_lines = []
+        run_begins = []
+        run_ends = []
+        run_codes = []
+        run_values = []
+        for line, row in enumerate(rows):
+            position = -start
+            for cell in row.iterchildren(_clark_cell, _clark_covered_cell):
+                repeated = cell.get(_clark_cells_repeated)
+                begin = position
+                position += int(repeated) if repeated else 1
+                if position <= 0:
+                    continue
+                if z is not None and begin >= width:
+                    break
+                code = _array_types.get(cell.get(_clark_value_type))
+                if code is None:
+                    continue
+                value = _get_array_value(cell, code)
+                if value is None:
+                    continue
+                run_lines.append(line)
+                run_begins.append(begin)
+                run_ends.append(position)
+                run_codes.append(code)
+                run_values.append(value)
+        if z is None and run_ends:
+            # Longer rows shouldn't exist!
+            width = max(width, max(run_ends))
+        # Expand the runs to cells at once, one line by distinct row
+        begins = numpy.clip(numpy.array(run_begins, dtype=numpy.intp), 0,
+                            width)
+        lengths = numpy.clip(numpy.array(run_ends, dtype=numpy.intp), 0,
+                             width) - begins
+        runs = numpy.repeat(numpy.arange(len(lengths)), lengths)
+        offsets = numpy.arange(len(runs)) - numpy.repeat(
+                numpy.cumsum(lengths) - lengths, lengths)
+        lines = numpy.array(run_lines, dtype=numpy.intp)[runs]
+        cells = begins[runs] + offsets
+        run_codes = numpy.array(run_codes, dtype=numpy.int8)
+        codes = numpy.zeros((len(rows), width), dtype=numpy.int8)
+        codes[lines, cells] = run_codes[runs]
+        numbers = numpy.zeros((len(rows), width))
+        others = numpy.empty((len(rows), width), dtype=object)
+        is_number = ((run_codes == _ARRAY_FLOAT)
+                     | (run_codes == _ARRAY_BOOLEAN))
+        if is_number.all():
+            numbers[lines, cells] = numpy.array(run_values)[runs]
+        else:
+            values = numpy.empty(len(run_values), dtype=object)
+            values[:] = run_values
+            is_number = is_number[runs]
+            numbers[lines[is_number], cells[is_number]] = (
+                    values[runs[is_number]].astype(float))
+            is_other = ~is_number
+            others[lines[is_other], cells[is_other]] = (
+                    values[runs[is_other]])
+        # Repeat the typed columns, not the cells
+        row_repeats = numpy.array(row_repeats, dtype=numpy.intp)
+        columns = []
+        for index in range(width):
+            column, mask = _make_array_column(codes[:, index],
+                                              numbers[:, index],
+                                              others[:, index])
+            columns.append(numpy.ma.masked_array(
+                numpy.repeat(column, row_repeats),
+                mask=numpy.repeat(mask, row_repeats)))
+        return columns
+
+
     def set_values(self, values, coord=None, style=None, cell_type=None,
                    currency=None):
         """set the value of cells in the table, from the 'coord' position
@@ -2256,6 +2855,165 @@ class odf_table(odf_element):
     #set_table_values = obsolete('set_table_values', set_values)
 
 
+    def from_array(self, values, coord=None, style=None, cell_type=None,
+                   currency=None):
+        """Set the value of cells in the table like set_values, but for big
+        blocks of values: the XML of the rows is made and parsed at once,
+        adjacent equal values are merged in repeated cells, and the row and
+        column positions are computed once at the end.
+
+        A 2D NumPy array or list of lists is expected, with as many lists as
+        rows. None values, and NaN, create empty cells with no cell type
+        (but eventually a style).
+
+        Arguments:
+
+            values -- list of lists of python types, or numpy.ndarray
+
+            coord -- tuple or str
+
+            cell_type -- 'boolean', 'currency', 'date', 'float', 'percentage',
+                         'string' or 'time'
+
+            currency -- three-letter str
+
+            style -- unicode
+        """
+        if coord:
+            x, y = self._translate_cell_coordinates(coord)
+        else:
+            x = y = 0
+        x = x or 0
+        y = y or 0
+        if hasattr(values, 'tolist'):
+            values = _array_to_list(values)
+        values = [_array_to_list(row_values)
+                  if hasattr(row_values, 'tolist')
+                  else row_values for row_values in values]
+        # Empty lists leave the row as is, the last ones are ignored
+        while values and not values[-1]:
+            values.pop()
+        if not values:
+            return
+        end = y + len(values)
+        # The rows in place: before, in and after the area
+        (rows, repeats), = self._children_repeated_sequences(
+                (('table:table-row',), 'table:number-rows-repeated'))
+        overlapped = []
+        old_rows = []
+        position = 0
+        for row, repeated in zip(rows, repeats):
+            begin = position
+            position += repeated
+            if position <= y or begin >= end:
+                continue
+            overlapped.append((row, begin, position))
+            old_rows.extend([row] * (min(position, end) - max(begin, y)))
+        height = position
+        old_rows.extend([None] * (end - max(height, y)))
+        # The XML of the new rows
+        if style is None:
+            style = ''
+        else:
+            style = ' table:style-name=%s' % quoteattr(style)
+        cache = {}
+        data = []
+        copies = []
+        width = 0
+        for row_values, row in zip(values, old_rows):
+            if not row_values:
+                data.append('<table:table-row/>')
+                copies.append(row)
+                continue
+            stop = x + len(row_values)
+            if row is None:
+                before, after, row_width = [], [], 0
+            else:
+                before, after, row_width = _copy_row_cells(row, x, stop)
+            copies.append((before, after))
+            width = max(width, row_width, stop)
+            data.append('<table:table-row>')
+            if row_width < x:
+                repeated = x - row_width
+                data.append('<table:table-cell%s/>' % (
+                    ' table:number-columns-repeated="%d"' % repeated
+                    if repeated > 1 else ''))
+            _append_cells_data(data, row_values, style, cell_type, currency,
+                               cache)
+            data.append('</table:table-row>')
+        if y > height:
+            # Empty rows up to the area
+            repeated = y - height
+            data.insert(0, '<table:table-row%s/>' % (
+                ' table:number-rows-repeated="%d"' % repeated
+                if repeated > 1 else ''))
+        data = '<table:table>%s</table:table>' % ''.join(data)
+        new_rows = list(fromstring(ns_document_data % data.encode())[0])
+        filler = new_rows.pop(0) if y > height else None
+        # Keep the rest of the old rows and their attributes
+        for new_row, row, copy in zip(new_rows, old_rows, copies):
+            if type(copy) is not tuple:
+                # Unchanged
+                if row is not None:
+                    new_row.attrib.update(row.attrib)
+                    new_row[:] = [deepcopy(child) for child in row]
+                    _set_native_repeated(new_row, _clark_rows_repeated, 1)
+                continue
+            if row is not None:
+                new_row.attrib.update(row.attrib)
+                _set_native_repeated(new_row, _clark_rows_repeated, 1)
+            before, after = copy
+            if before:
+                new_row[0:0] = before
+            if after:
+                new_row.extend(after)
+        if filler is not None:
+            new_rows.insert(0, filler)
+        # Replace the rows in place
+        if not overlapped:
+            if rows:
+                _before_change(rows[-1])
+                current = rows[-1]
+            else:
+                current = new_rows.pop(0)
+                self._append(_make_odf_element(current))
+            for new_row in new_rows:
+                current.addnext(new_row)
+                current = new_row
+        else:
+            _before_change(rows[0])
+            row, begin, position = overlapped[0]
+            if begin < y:
+                current = row
+                if position > end:
+                    # Also after the area
+                    copy = deepcopy(row)
+                    _set_native_repeated(copy, _clark_rows_repeated,
+                                         position - end)
+                    new_rows.append(copy)
+                _set_native_repeated(row, _clark_rows_repeated, y - begin)
+                for new_row in new_rows:
+                    current.addnext(new_row)
+                    current = new_row
+                overlapped.pop(0)
+            else:
+                for new_row in new_rows:
+                    row.addprevious(new_row)
+            for row, begin, position in overlapped:
+                if position > end:
+                    _set_native_repeated(row, _clark_rows_repeated,
+                                         position - end)
+                else:
+                    row.getparent().remove(row)
+        self._compute_table_cache()
+        if self._batched:
+            # Columns are synchronized at the end of the batch
+            return
+        diff = width - self.get_width()
+        if diff > 0:
+            self.append_column(odf_create_column(repeated=diff))
+
+
     def rstrip(self, aggressive=False):
         """Remove *in-place* empty rows below and empty cells at the right of
         the table. Cells are empty if they contain no value or it evaluates
@@ -2279,8 +3037,6 @@ class odf_table(odf_element):
             row.rstrip(aggressive=aggressive)
             # keep count of the biggest row
             max_width = max(max_width, row.get_width())
-        # raz cache of rows
-        self._indexes['_tmap'] = {}
         # Step 3: trim columns to match max_width
         columns = self._get_columns()
         repeated_cols = self.xpath(
@@ -2300,8 +3056,6 @@ class odf_table(odf_element):
                     diff = -repeated
                     if diff == 0:
                         break
-        # raz cache of columns
-        self._indexes['_cmap'] = {}
         self._compute_table_cache()
 
     #rstrip_table = obsolete('rstrip_table', rstrip)
@@ -2322,7 +3076,7 @@ class odf_table(odf_element):
         """
         data = []
         if coord is None:
-            for row in self.traverse():
+            for row in self.traverse(clone=False):
                 data.append([cell for cell in row.traverse()])
             transposed_data = list(*data)
             self.clear()
@@ -2352,7 +3106,7 @@ class odf_table(odf_element):
                 t = self.get_height() - 1
             else:
                 t = min(t, self.get_height() - 1)
-            for row in self.traverse(start=y, end=t):
+            for row in self.traverse(start=y, end=t, clone=False):
                 data.append([cell for cell in row.traverse(start=x, end=z)])
             transposed_data = list(*data)
             # clear locally
@@ -2394,7 +3148,7 @@ class odf_table(odf_element):
         return self.get_elements(_xpath_row)
 
 
-    def traverse(self, start=None, end=None):
+    def traverse(self, start=None, end=None, clone=True):
         """Yield as many row elements as expected rows in the table, i.e.
         expand repetitions by returning the same row as many times as
         necessary.
@@ -2405,7 +3159,11 @@ class odf_table(odf_element):
 
                 end -- int
 
-        Copies are returned, use ``set_row`` to push them back.
+                clone -- bool
+
+        Copies are returned, use ``set_row`` to push them back. Without
+        clone, the rows of the table are returned as they are, repetition
+        included, for reading only.
         """
         idx = -1
         before = -1
@@ -2413,19 +3171,16 @@ class odf_table(odf_element):
         if start is None and end is None:
             for juska in self._tmap:
                 idx += 1
-                if idx in self._indexes['_tmap']:
-                    row = self._indexes['_tmap'][idx]
-                else:
-                    row = self._get_element_idx2(_xpath_row_idx, idx)
-                    self._indexes['_tmap'][idx] = row
+                row = _get_item_in_vault(idx, self, _xpath_row_idx, self._tmap)
                 repeated = juska - before
                 before = juska
                 for i in range(repeated or 1):
                     # Return a copy without the now obsolete repetition
-                    row = row.clone()
+                    if clone:
+                        row = row.clone()
                     row.y = y
                     y += 1
-                    if repeated > 1:
+                    if clone and repeated > 1:
                         row.set_repeated(None)
                     yield row
         else:
@@ -2447,19 +3202,17 @@ class odf_table(odf_element):
             y = start
             for juska in self._tmap[start_map:]:
                 idx += 1
-                if idx in self._indexes['_tmap']:
-                    row = self._indexes['_tmap'][idx]
-                else:
-                    row = self._get_element_idx2(_xpath_row_idx, idx)
-                    self._indexes['_tmap'][idx] = row
+                row = _get_item_in_vault(idx, self, _xpath_row_idx, self._tmap)
                 repeated = juska - before
                 before = juska
                 for i in range(repeated or 1):
                     if y <= end:
-                        row = row.clone()
+                        if clone:
+                            row = row.clone()
                         row.y = y
                         y += 1
-                        if repeated > 1 or (y == start and start > 0):
+                        if clone and (repeated > 1 or
+                                      (y == start and start > 0)):
                             row.set_repeated(None)
                         yield row
 
@@ -2512,11 +3265,7 @@ class odf_table(odf_element):
     def _get_row2_base(self, y):
         idx = _find_odf_idx(self._tmap, y)
         if idx is not None:
-            if idx in self._indexes['_tmap']:
-                row = self._indexes['_tmap'][idx]
-            else:
-                row = self._get_element_idx2(_xpath_row_idx, idx)
-                self._indexes['_tmap'][idx] = row
+            row = _get_item_in_vault(idx, self, _xpath_row_idx, self._tmap)
             return row
         return None
 
@@ -2623,15 +3372,11 @@ class odf_table(odf_element):
 
         """
         self.extend(rows)
+        if self._batched:
+            return
         self._compute_table_cache()
         # Update width if necessary
-        width = self.get_width()
-        for row in self.traverse():
-            if row.get_width() > width:
-                width = row.get_width()
-        diff = width - self.get_width()
-        if diff > 0:
-            self.append_column(odf_create_column(repeated=diff))
+        self.__update_width_all()
 
 
     def append_row(self, row=None, clone=True, _repeated=None):
@@ -2658,13 +3403,18 @@ class odf_table(odf_element):
             row = row.clone()
         # Appending a repeated row accepted
         # Do not insert next to the last row because it could be in a group
+        # Compute the cache, if not yet, before the change
+        tmap = self._tmap
         self._append(row)
         if _repeated is None:
             _repeated = row.get_repeated() or 1
-        self._tmap = _insert_map_once(self._tmap, len(self._tmap), _repeated)
+        tmap.insert(len(tmap), _repeated, row)
         row.y = self.get_height() - 1
+        if self._batched:
+            # Columns are synchronized at the end of the batch
+            return row
         # Initialize columns
-        if not self._get_columns():
+        if not self._cmap:
             repeated = row.get_width()
             self.insert(odf_create_column(repeated=repeated),
                     position=0)
@@ -2832,7 +3582,7 @@ class odf_table(odf_element):
         else:
             x = y = z = t = None
         cells = []
-        for row in self.traverse(start = y, end = t):
+        for row in self.traverse(start=y, end=t, clone=False):
             row_cells = row.get_cells(coord = (x, z), cell_type=cell_type,
                                             style=style, content=content)
             if flat:
@@ -2850,12 +3600,17 @@ class odf_table(odf_element):
         They are either a 2-uplet of (x, y) starting from 0, or a
         human-readable position like "C4".
 
-        A copy is returned, use ``set_cell`` to push it back.
+        A copy is returned, use ``set_cell`` to push it back. Without
+        clone, the cell of the table is returned, for reading only.
 
         Arguments:
 
             coord -- (int, int) or str
 
+            clone -- bool
+
+            keep_repeated -- bool
+
         Return: odf_cell
         """
         x, y = self._translate_cell_coordinates(coord)
@@ -2868,6 +3623,9 @@ class odf_table(odf_element):
             if not keep_repeated:
                 repeated = cell.get_repeated() or 1
                 if repeated >= 2:
+                    # Don't change the table
+                    if not clone:
+                        cell = cell.clone()
                     cell.set_repeated(None)
         cell.x = x
         cell.y = y
@@ -3192,11 +3950,7 @@ class odf_table(odf_element):
         if start is None and end is None:
             for juska in self._cmap:
                 idx += 1
-                if idx in self._indexes['_cmap']:
-                    column = self._indexes['_cmap'][idx]
-                else:
-                    column = self._get_element_idx2(_xpath_column_idx, idx)
-                    self._indexes['_cmap'][idx] = column
+                column = _get_item_in_vault(idx, self, _xpath_column_idx, self._cmap)
                 repeated = juska - before
                 before = juska
                 for i in range(repeated or 1):
@@ -3226,11 +3980,7 @@ class odf_table(odf_element):
             x = start
             for juska in self._cmap[start_map:]:
                 idx += 1
-                if idx in self._indexes['_cmap']:
-                    column = self._indexes['_cmap'][idx]
-                else:
-                    column = self._get_element_idx2(_xpath_column_idx, idx)
-                    self._indexes['_cmap'][idx] = column
+                column = _get_item_in_vault(idx, self, _xpath_column_idx, self._cmap)
                 repeated = juska - before
                 before = juska
                 for i in range(repeated or 1):
@@ -3278,7 +4028,8 @@ class odf_table(odf_element):
         # Inside the defined table
         odf_idx = _find_odf_idx(self._cmap, x)
         if odf_idx is not None:
-            column = self._get_element_idx2(_xpath_column_idx, odf_idx)
+            column = _get_item_in_vault(odf_idx, self, _xpath_column_idx,
+                                        self._cmap)
             # fixme : no clone here => change doc and unit tests
             return column.clone()
             #return row
@@ -3375,6 +4126,8 @@ class odf_table(odf_element):
                 row.insert_cell(x, odf_create_cell(repeated=repeated))
             # Shorter rows don't need insert
             # Longer rows shouldn't exist!
+        # The rows known by the map have an obsolete cache
+        self._tmap.clear_items()
         return column_back
 
 
@@ -3395,18 +4148,18 @@ class odf_table(odf_element):
             column = odf_create_column()
         else:
             column = column.clone()
+        column.x = self.get_width()
         if len(self._cmap) == 0:
-            position = 0
+            self.insert(column, position=0)
         else:
             odf_idx = len(self._cmap) - 1
-            last_column = self._get_element_idx2(_xpath_column_idx, odf_idx)
-            position = self.index(last_column) + 1
-        column.x = self.get_width()
-        self.insert(column, position = position)
+            last_column = _get_item_in_vault(odf_idx, self, _xpath_column_idx,
+                                             self._cmap)
+            last_column.insert(column, xmlposition=NEXT_SIBLING)
         # Repetitions are accepted
         if _repeated is None:
             _repeated = column.get_repeated() or 1
-        self._cmap = _insert_map_once(self._cmap, len(self._cmap), _repeated)
+        self._cmap.insert(len(self._cmap), _repeated, column)
         # No need to update row widths
         return column
 
@@ -3433,6 +4186,8 @@ class odf_table(odf_element):
         for row in self._get_rows():
             if row.get_width() >= width:
                 row.delete_cell(x)
+        # The rows known by the map have an obsolete cache
+        self._tmap.clear_items()
 
 
     def get_column_cells(self, x, style=None, content=None, cell_type=None,
@@ -3467,10 +4222,10 @@ class odf_table(odf_element):
             cell_type = cell_type.lower().strip()
         cells = []
         if not style and not content and not cell_type:
-            for row in self.traverse():
+            for row in self.traverse(clone=False):
                 cells.append(row.get_cell(x, clone=True))
             return cells
-        for row in self.traverse():
+        for row in self.traverse(clone=False):
             cell = row.get_cell(x, clone=True)
         # Filter the cells by cell_type
             if cell_type:
@@ -3924,6 +4679,8 @@ class odf_named_range(odf_element):
 
         usage -- None or str, usage of the named range.
     """
+    __slots__ = ('name', 'usage', 'table_name', 'start', 'end', 'crange')
+
     def __init__(self, native_element):
         odf_element.__init__(self, native_element)
         self.name = self.get_attribute('table:name')
@@ -158,6 +158,7 @@ def odf_create_toc_level_style(level):
 
 
 class odf_toc(odf_element):
+    __slots__ = ()
 
     def get_formatted_text(self, context):
         index_body = self.get_element('text:index-body')
@@ -339,6 +340,7 @@ class odf_toc(odf_element):
 
 
 class odf_index_title_template(odf_element):
+    __slots__ = ()
 
     def get_style(self):
         return self.get_attribute('text:style-name')
@@ -350,6 +352,7 @@ class odf_index_title_template(odf_element):
 
 
 class odf_toc_entry_template(odf_element):
+    __slots__ = ()
 
     def get_style(self):
         return self.get_attribute('text:style-name')
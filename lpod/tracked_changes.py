@@ -48,6 +48,8 @@ class odf_change_info(odf_element):
          - get_paragraphs and get_paragraph methods for actual odf_paragraph.
          - get_comments for a plain text version
     """
+    __slots__ = ()
+
     def set_dc_creator(self, creator=None):
         """Set the creator of the change. Default for creator is 'Unknown'.
 
@@ -130,6 +132,8 @@ class odf_text_insertion(odf_element):
        value of which binds that parent element to the text:change-id attribute
        on the <text:change-start> and <text:change-end> elements.
     """
+    __slots__ = ()
+
     def get_deleted(self, as_text=False, no_header=False):
         """Return: None.
         """
@@ -248,6 +252,8 @@ class odf_text_deletion(odf_text_insertion):
          - Otherwise, copy the text content of the <text:deletion> element in
          place of the change mark.
     """
+    __slots__ = ()
+
     def get_deleted(self, as_text=False, no_header=False):
         """Get the deleted informations stored in the <text:deletion>.
         If as_text is True: returns the text content.
@@ -318,6 +324,7 @@ class odf_text_format_change(odf_text_insertion):
        Note: This element does not contain formatting changes that have taken
        place.
     """
+    __slots__ = ()
 
 
 
@@ -339,6 +346,8 @@ class odf_text_changed_region(odf_element):
                 shall be of the same change type - insertion, format change or
                 deletion. "
     """
+    __slots__ = ()
+
     def get_change_info(self):
         """Shortcut to get the <office:change-info> element of the change
         element child.
@@ -413,6 +422,8 @@ class odf_tracked_changes(odf_element):
        scope. In this case, all change mark elements in this scope shall be
        ignored.
     """
+    __slots__ = ()
+
     def get_changed_regions(self, creator=None, date=None, content=None,
                             role=None):
         changed_regions = _get_elements(self, 'text:changed-region',
@@ -441,6 +452,8 @@ class odf_text_change(odf_element):
     """The <text:change> element marks a position in an empty region where text
        has been deleted.
     """
+    __slots__ = ()
+
     def get_id(self):
         return self.get_attribute('text:change-id')
 
@@ -505,6 +518,8 @@ class odf_text_change_end(odf_text_change):
     """The <text:change-end> element marks the end of a region with content
        where text has been inserted or the format has been changed.
     """
+    __slots__ = ()
+
     def get_start(self):
         """Return the corresponding annotation starting tag or None.
         """
@@ -571,6 +586,8 @@ class odf_text_change_start(odf_text_change_end):
     """The <text:change-start> element marks the start of a region with content
        where text has been inserted or the format has been changed.
     """
+    __slots__ = ()
+
     def get_start(self):
         """Return self.
         """
@@ -29,6 +29,7 @@
 # Import from the Standard Library
 from datetime import date, datetime, timedelta
 from decimal import Decimal as dec
+from itertools import islice
 from os import getcwd
 from os.path import splitdrive, join, sep
 from re import search
@@ -94,7 +95,14 @@ def _make_xpath_query(element_name, family=None, text_style=None,
         display_name=None, note_class=None, text_id=None, text_name=None,
         change_id=None, office_name=None, office_title=None, outline_level=None,
         level=None, page_layout=None, master_page=None, parent_style=None,
-        presentation_class=None, position=None, **kw):
+        presentation_class=None, position=None, variables=None, **kw):
+    """Build an XPath query for the given element name, filtered on the given
+    attribute values and at the given position.
+
+    If a "variables" dict is given, the values are not spliced into the query
+    but stored in it as XPath variables ("$v0", "$v1"...), so the query only
+    depends on the attribute names. Pass them along when evaluating the query.
+    """
     query = [element_name]
     attributes = kw
     if text_style:
@@ -146,6 +154,10 @@ def _make_xpath_query(element_name, family=None, text_style=None,
         value = attributes[qname]
         if value is True:
             query.append('[@%s]' % qname)
+        elif variables is not None:
+            name = 'v%d' % len(variables)
+            variables[name] = str(value)
+            query.append('[@%s=$%s]' % (qname, name))
         else:
             query.append('[@%s="%s"]' % (qname, str(value)))
     query = ''.join(query)
@@ -272,47 +284,57 @@ def _merge_dicts(d, *args, **kw):
 # Non-public yet useful helpers
 #
 
-def _get_elements(context, element_name, content=None, url=None,
+def _iter_elements(context, element_name, content=None, url=None,
         svg_title=None, svg_desc=None, dc_creator=None, dc_date=None, **kw):
-    query = _make_xpath_query(element_name, **kw)
-    elements = context.get_elements(query)
-    # Filter the elements with the regex (TODO use XPath)
-    if content is not None:
-        elements = [element for element in elements if element.match(content)]
-    if url is not None:
-        filtered = []
-        for element in elements:
-            url_attr = element.get_attribute('xlink:href')
-            if search(url, url_attr) is not None:
-                filtered.append(element)
-        elements = filtered
+    variables = {}
+    query = _make_xpath_query(element_name, variables=variables, **kw)
     if dc_date is not None:
         # XXX Date or DateTime?
         dc_date = DateTime.encode(dc_date)
-    for variable, childname in [
+    children = [(variable, childname) for variable, childname in [
             (svg_title, 'svg:title'),
             (svg_desc, 'svg:desc'),
             (dc_creator, 'descendant::dc:creator'),
-            (dc_date, 'descendant::dc:date')]:
-        if not variable:
+            (dc_date, 'descendant::dc:date')] if variable]
+    for element in context.iter_elements(query, **variables):
+        # Filter the elements with the regex (TODO use XPath)
+        if content is not None and not element.match(content):
             continue
-        filtered = []
-        for element in elements:
+        if url is not None:
+            url_attr = element.get_attribute('xlink:href')
+            if search(url, url_attr) is None:
+                continue
+        for variable, childname in children:
             child = element.get_element(childname)
-            if child and child.match(variable):
-                filtered.append(element)
-        elements = filtered
-    return elements
+            if not (child and child.match(variable)):
+                break
+        else:
+            yield element
+
+
+
+def _get_elements(context, element_name, **kw):
+    return list(_iter_elements(context, element_name, **kw))
 
 
 
 def _get_element(context, element_name, position, **kw):
-    # TODO Transmit position not to load the whole list
-    result = _get_elements(context, element_name, **kw)
-    try:
-        return result[position]
-    except IndexError:
-        return None
+    for name in ('content', 'url', 'svg_title', 'svg_desc', 'dc_creator',
+            'dc_date'):
+        if kw.get(name) is not None:
+            # Filtered in Python, stop at the requested element if possible
+            elements = _iter_elements(context, element_name, **kw)
+            if position >= 0:
+                return next(islice(elements, position, None), None)
+            result = list(elements)
+            try:
+                return result[position]
+            except IndexError:
+                return None
+        kw.pop(name, None)
+    variables = {}
+    query = _make_xpath_query(element_name, variables=variables, **kw)
+    return context.get_element(query, position, **variables)
 
 
 
@@ -33,7 +33,7 @@ from io import BytesIO
 from lxml.etree import parse, tostring
 
 # Import from lpod
-from .element import _make_odf_element
+from .element import _make_odf_element, _watch_tree, _unwatch_tree
 #from utils import obsolete
 
 
@@ -48,18 +48,47 @@ class odf_xmlpart(object):
         # Internal state
         self.__tree = None
         self.__root = None
+        # Root of the tree shared with the part we were cloned from
+        self.__shared = None
+        # Tree changed since loaded
+        self.__modified = False
 
 
     def __get_tree(self):
+        if self.__tree is None and self.__shared is not None:
+            self._unshare()
         if self.__tree is None:
             container = self.container
             part = container.get_part(self.part_name)
             if type(part) is str:
                 part = part.encode()
             self.__tree = parse(BytesIO(part))
+            _watch_tree(self.__tree.getroot(), self)
         return self.__tree
 
 
+    def _unshare(self):
+        """Make our own copy of the tree shared since cloned, before either
+        part changes it.
+        """
+        shared = self.__shared
+        if shared is None:
+            return
+        self.__shared = None
+        _unwatch_tree(shared, self)
+        self.__tree = deepcopy(shared.getroottree())
+        _watch_tree(self.__tree.getroot(), self)
+
+
+    def _before_change(self, root):
+        """Called before the tree of the given root element changes.
+        """
+        if root is self.__shared:
+            self._unshare()
+        else:
+            self.__modified = True
+
+
     #
     # Public API
     #
@@ -71,48 +100,91 @@ class odf_xmlpart(object):
         return self.__root
 
 
-    def get_elements(self, xpath_query):
+    def get_elements(self, xpath_query, **variables):
         root = self.get_root()
-        return root.xpath(xpath_query)
+        return root.xpath(xpath_query, **variables)
 
     #get_element_list = obsolete('get_element_list', get_elements)
 
 
-    def get_element(self, xpath_query):
-        result = self.get_elements(xpath_query)
-        if not result:
-            return None
-        return result[0]
+    def iter_elements(self, xpath_query, **variables):
+        root = self.get_root()
+        return root.iter_elements(xpath_query, **variables)
+
+
+    def get_element(self, xpath_query, position=0, **variables):
+        root = self.get_root()
+        return root.get_element(xpath_query, position, **variables)
 
 
     def delete_element(self, child):
         child.delete()
 
 
-    def xpath(self, xpath_query):
+    def xpath(self, xpath_query, **variables):
         """Apply XPath query to the XML part. Return list of odf_element or
         odf_text instances translated from the nodes found.
+
+        Values referenced in the query as "$name" are given as keyword
+        arguments.
         """
         root = self.get_root()
-        return root.xpath(xpath_query)
+        return root.xpath(xpath_query, **variables)
 
 
-    def clone(self):
+    def clone(self, container=None):
+        """Return a copy of the XML part, in the given container or in a
+        clone of ours. The tree is copied on write: until either part
+        changes it or the clone reads it.
+        """
         clone = object.__new__(self.__class__)
         for name in self.__dict__:
             if name == 'container':
-                setattr(clone, name, self.container.clone())
-            elif name in ('_odf_xmlpart__tree',):
+                if container is None:
+                    container = self.container.clone()
+                setattr(clone, name, container)
+            elif name in ('_odf_xmlpart__tree', '_odf_xmlpart__root',
+                    '_odf_xmlpart__shared'):
                 setattr(clone, name, None)
             else:
                 value = getattr(self, name)
                 value = deepcopy(value)
                 setattr(clone, name, value)
+        if self.__tree is not None:
+            shared = self.__tree.getroot()
+        else:
+            # Unparsed, or itself still sharing
+            shared = self.__shared
+        if shared is not None:
+            clone.__shared = shared
+            _watch_tree(shared, clone)
         return clone
 
 
+    def is_modified(self):
+        """Tell whether the tree was changed since loaded, so it must be
+        serialized again.
+        """
+        return self.__modified
+
+
+    def write(self, file, pretty=False):
+        """Serialize the XML part to the given (binary) file, as it goes.
+        """
+        if self.__tree is None and self.__shared is not None:
+            tree = self.__shared.getroottree()
+        else:
+            tree = self.__get_tree()
+        file.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
+        tree.write(file, encoding='UTF-8', pretty_print=pretty)
+
+
     def serialize(self, pretty=False):
-        tree = self.__get_tree()
+        if self.__tree is None and self.__shared is not None:
+            # No need for a copy to read it
+            tree = self.__shared.getroottree()
+        else:
+            tree = self.__get_tree()
         # Lxml declaration is too exotic to me
         data = ['<?xml version="1.0" encoding="UTF-8"?>']
         tree = tostring(tree, encoding='UTF-8', pretty_print=pretty)
@@ -28,7 +28,7 @@
 
 # Import from the standard library
 from optparse import OptionParser
-from sys import exit, stderr
+from sys import exit, stderr, stdout
 from urllib.request import urlopen, HTTPPasswordMgrWithDefaultRealm
 from urllib.request import HTTPBasicAuthHandler, build_opener
 from urllib.parse import urlsplit, urlunsplit
@@ -91,7 +91,8 @@ if  __name__ == '__main__':
     if target is None:
         printerr('"-o" option mandatory (use "-" to print to stdout)')
         exit(1)
-    check_target_file(target)
+    if target != "-":
+        check_target_file(target)
 
     output_document = odf_new_document('presentation')
     output_meta = output_document.get_part(ODF_META)
@@ -181,6 +182,9 @@ if  __name__ == '__main__':
         output_body = output_document.get_body()
         output_body.append(page)
 
-    output_document.save(target, pretty=True)
-    print(file=stderr)
-    print("%s generated" % target, file=stderr)
+    if target == "-":
+        output_document.save(stdout.buffer, pretty=True)
+    else:
+        output_document.save(target, pretty=True)
+        print(file=stderr)
+        print("%s generated" % target, file=stderr)
@@ -38,7 +38,7 @@ from lpod.document import odf_new_document, odf_get_document
 from lpod.element import FIRST_CHILD
 from lpod.table import import_from_csv
 from lpod.toc import odf_create_toc
-from lpod.scriptutils import add_option_output, StdoutWriter
+from lpod.scriptutils import add_option_output
 from lpod.scriptutils import printerr, printinfo, get_mimetype
 from lpod.scriptutils import check_target_file
 
@@ -259,7 +259,7 @@ if  __name__ == '__main__':
     # Save
     if output_doc is not None:
         if target == "-":
-            target = StdoutWriter()
+            target = stdout.buffer
         output_doc.save(target=target, pretty=True)
         if options.output:
             printinfo('Document "%s" generated' % options.output)
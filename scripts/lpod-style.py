@@ -34,7 +34,7 @@ from sys import exit, stdout
 from lpod import __version__
 from lpod.const import ODF_CLASSES
 from lpod.document import odf_get_document
-from lpod.scriptutils import add_option_output, StdoutWriter, printinfo
+from lpod.scriptutils import add_option_output, printinfo
 from lpod.scriptutils import check_target_file, printerr
 
 
@@ -168,7 +168,7 @@ if  __name__ == '__main__':
                     'output file needed or "-" for stdout')
             exit(1)
         elif target == "-":
-            target = StdoutWriter()
+            target = stdout.buffer
         else:
             check_target_file(target)
         delete_styles(document, target)
@@ -29,16 +29,36 @@
 
 # Import from the Standard Library
 import os
-from io import StringIO
+from io import StringIO, BytesIO, UnsupportedOperation
 from ftplib import FTP
 from os import mkdir
-from shutil import rmtree
+from shutil import copyfile, rmtree
 from unittest import TestCase, main
 from urllib.request import urlopen
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
 
 # Import from lpod
 from lpod.const import ODF_EXTENSIONS, ODF_CONTENT, ODF_META
+from lpod.const import ODF_MANIFEST, ODF_STYLES
 from lpod.container import odf_get_container, odf_new_container
+from lpod.container import clear_template_cache
+
+
+class Pipe(BytesIO):
+    """Write-only file that can't seek, like stdout or a socket.
+    """
+
+    def seekable(self):
+        return False
+
+
+    def seek(self, *args):
+        raise UnsupportedOperation('seek')
+
+
+    def tell(self):
+        raise UnsupportedOperation('tell')
+
 
 
 class NewContainerFromTemplateTestCase(TestCase):
@@ -75,6 +95,31 @@ class NewContainerFromTemplateTestCase(TestCase):
         self.assertEqual(mimetype, ODF_EXTENSIONS['odg'])
 
 
+    def test_template_cache(self):
+        mkdir('trash')
+        try:
+            path = 'trash/template.ott'
+            copyfile('../lpod/templates/text.ott', path)
+            container = odf_new_container(path)
+            data = container._odf_container__data
+            # Loaded once
+            container = odf_new_container(path)
+            self.assertTrue(container._odf_container__data is data)
+            # Loaded again when changed
+            copyfile('../lpod/templates/spreadsheet.ots', path)
+            os.utime(path, ns=(0, 0))
+            container = odf_new_container(path)
+            self.assertFalse(container._odf_container__data is data)
+            self.assertEqual(container.get_part('mimetype'),
+                    ODF_EXTENSIONS['ods'])
+            data = container._odf_container__data
+            clear_template_cache()
+            container = odf_new_container(path)
+            self.assertFalse(container._odf_container__data is data)
+        finally:
+            rmtree('trash')
+
+
 
 class NewContainerFromTypeTestCase(TestCase):
 
@@ -133,6 +178,15 @@ class ContainerTestCase(TestCase):
         self.assertNotEqual(clone._odf_container__data, None)
 
 
+    def test_lazy_loading(self):
+        container = odf_get_container('samples/example.odt')
+        parts = container._odf_container__parts
+        self.assertEqual(list(parts.keys()), ['mimetype'])
+        content = container.get_part(ODF_CONTENT)
+        self.assertTrue(b'<office:document-content' in content)
+        self.assertEqual(sorted(parts.keys()), [ODF_CONTENT, 'mimetype'])
+
+
     def test_get_part_xml(self):
         container = odf_get_container('samples/example.odt')
         content = container.get_part(ODF_CONTENT)
@@ -164,6 +218,13 @@ class ContainerTestCase(TestCase):
         self.assertEqual(container.get_part(path), data)
 
 
+    def test_set_part_writer(self):
+        container = odf_get_container('samples/example.odt')
+        path = 'Pictures/a.jpg'
+        container.set_part(path, lambda file: file.write(b'JFIF'))
+        self.assertEqual(container.get_part(path), b'JFIF')
+
+
     def test_del_part(self):
         container = odf_get_container('samples/example.odt')
         # Not a realistic test
@@ -195,6 +256,108 @@ class ContainerSaveTestCase(TestCase):
         self.assertEqual(mimetype, ODF_EXTENSIONS['odt'])
 
 
+    def test_save_over_itself(self):
+        container = odf_get_container('samples/example.odt')
+        container.save('trash/example.odt')
+        container = odf_get_container('trash/example.odt')
+        container.save()
+        # The original archive is still readable
+        content = container.get_part(ODF_CONTENT)
+        self.assertTrue(b'<office:document-content' in content)
+        new_container = odf_get_container('trash/example.odt')
+        self.assertEqual(new_container.get_part(ODF_CONTENT), content)
+
+
+    def test_save_zip_raw_copy(self):
+        container = odf_get_container('samples/frame_image.odp')
+        content = container.get_part(ODF_CONTENT)
+        container.set_part(ODF_CONTENT, content.replace(b'draw:frame',
+            b'draw:frame'))
+        container.save('trash/frame_image.odp')
+        # Unchanged parts were not even loaded
+        parts = container._odf_container__parts
+        self.assertEqual(sorted(parts.keys()), [ODF_CONTENT, 'mimetype'])
+        source = ZipFile('samples/frame_image.odp')
+        result = ZipFile('trash/frame_image.odp')
+        self.assertEqual(result.testzip(), None)
+        self.assertEqual(result.namelist()[0], 'mimetype')
+        self.assertEqual(result.namelist()[-1], 'META-INF/manifest.xml')
+        for zinfo in source.infolist():
+            if zinfo.filename in (ODF_CONTENT, 'mimetype'):
+                continue
+            copy = result.getinfo(zinfo.filename)
+            self.assertEqual(copy.CRC, zinfo.CRC)
+            self.assertEqual(copy.compress_size, zinfo.compress_size)
+
+
+    def test_save_zip_writer(self):
+        container = odf_get_container('samples/example.odt')
+        content = container.get_part(ODF_CONTENT)
+        container.set_part(ODF_CONTENT, lambda file: file.write(content))
+        container.save('trash/example.odt')
+        result = ZipFile('trash/example.odt')
+        self.assertEqual(result.testzip(), None)
+        self.assertEqual(result.read(ODF_CONTENT), content)
+
+
+    def test_save_zip_workers(self):
+        container = odf_get_container('samples/example.odt')
+        container.get_parts()
+        container.save('trash/example.odt', packaging='zip')
+        container.save('trash/example_workers.odt', packaging='zip',
+                workers=4)
+        expected = ZipFile('trash/example.odt')
+        result = ZipFile('trash/example_workers.odt')
+        self.assertEqual(result.testzip(), None)
+        self.assertEqual(result.namelist(), expected.namelist())
+        for zinfo in expected.infolist():
+            self.assertEqual(result.read(zinfo.filename),
+                    expected.read(zinfo.filename))
+
+
+    def test_save_zip_store(self):
+        container = odf_get_container('samples/frame_image.odp')
+        container.save('trash/frame_image.odp', store=['image/', '.xml'])
+        result = ZipFile('trash/frame_image.odp')
+        self.assertEqual(result.testzip(), None)
+        for zinfo in result.infolist():
+            if zinfo.filename == 'Thumbnails/thumbnail.png':
+                # No media type in the manifest, and not told to
+                expected = ZIP_DEFLATED
+            else:
+                expected = ZIP_STORED
+            self.assertEqual(zinfo.compress_type, expected)
+
+
+    def test_save_zip_level(self):
+        container = odf_get_container('samples/example.odt')
+        # Unchanged parts are copied as is
+        container.set_part(ODF_CONTENT, container.get_part(ODF_CONTENT))
+        container.save('trash/example.odt', level=0)
+        container.save('trash/example_level.odt', level=9)
+        fast = ZipFile('trash/example.odt').getinfo(ODF_CONTENT)
+        small = ZipFile('trash/example_level.odt').getinfo(ODF_CONTENT)
+        self.assertTrue(small.compress_size < fast.compress_size)
+
+
+    def test_save_zip_unseekable(self):
+        container = odf_get_container('samples/frame_image.odp')
+        content = container.get_part(ODF_CONTENT)
+        container.set_part(ODF_CONTENT, content.replace(b'draw:frame',
+            b'draw:frame'))
+        pipe = Pipe()
+        container.save(pipe)
+        result = ZipFile(BytesIO(pipe.getvalue()))
+        self.assertEqual(result.testzip(), None)
+        self.assertEqual(result.read(ODF_CONTENT), content)
+        for zinfo in result.infolist():
+            # No data descriptor
+            self.assertEqual(zinfo.flag_bits & 0x08, 0)
+        # Mimetype stored first, right after its header
+        mimetype = b'application/vnd.oasis.opendocument.presentation'
+        self.assertEqual(pipe.getvalue()[38:38 + len(mimetype)], mimetype)
+
+
     def test_save_folder(self):
         container = odf_get_container('samples/example.odt')
         container.save('trash/example.odt', packaging='folder')
@@ -241,13 +404,45 @@ class ContainerSaveTestCase(TestCase):
 
 
 
-    # XXX We must implement the flat xml part
-    def xtest_save_flat(self):
-        """TODO: 2 cases
+    def test_save_flat(self):
+        """2 cases
            1. from "zip" to "flat"
            2. from "flat" to "flat"
         """
-        raise NotImplementedError
+        container = odf_get_container('samples/example.odt')
+        container.save('trash/example.fodt', packaging='flat')
+        flat = odf_get_container('trash/example.fodt')
+        self.assertEqual(flat.get_part('mimetype'),
+                container.get_part('mimetype'))
+        self.assertTrue(ODF_MANIFEST in flat.get_parts())
+        content = flat.get_part(ODF_CONTENT)
+        self.assertTrue(b'<office:document-content' in content)
+        self.assertTrue(b'<office:body>' in content)
+        styles = flat.get_part(ODF_STYLES)
+        self.assertTrue(b'<office:master-styles>' in styles)
+        flat.save('trash/example2.fodt')
+        data = open('trash/example2.fodt', 'rb').read()
+        self.assertEqual(data.count(b'<office:body>'), 1)
+        self.assertEqual(data.count(b'<office:automatic-styles'), 1)
+
+
+    def test_save_flat_image(self):
+        container = odf_get_container('samples/frame_image.odp')
+        container.save('trash/frame_image.fodp', packaging='flat')
+        flat = odf_get_container('trash/frame_image.fodp')
+        content = flat.get_part(ODF_CONTENT)
+        self.assertTrue(b'<office:binary-data>' in content)
+        self.assertFalse(b'Pictures/' in content)
+
+
+    def test_save_flat_to_zip(self):
+        container = odf_get_container('samples/example.xml')
+        container.save('trash/example.odt', packaging='zip')
+        new_container = odf_get_container('trash/example.odt')
+        self.assertEqual(new_container.get_part('mimetype'),
+                container.get_part('mimetype'))
+        meta = new_container.get_part(ODF_META)
+        self.assertTrue(b'<office:meta>' in meta)
 
 
 
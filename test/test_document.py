@@ -29,7 +29,7 @@
 #
 
 # Import from the Standard Library
-from io import StringIO
+from io import StringIO, BytesIO
 from ftplib import FTP
 from unittest import TestCase, main
 from urllib.request import urlopen
@@ -41,6 +41,7 @@ from lpod.content import odf_content
 from lpod.document import odf_new_document, odf_get_document
 from lpod.manifest import odf_manifest
 from lpod.meta import odf_meta
+from lpod.paragraph import odf_create_paragraph
 from lpod.styles import odf_styles
 
 
@@ -70,6 +71,14 @@ class NewDocumentFromTemplateTestCase(TestCase):
         self.assertTrue(odf_new_document(path))
 
 
+    def test_independent_documents(self):
+        path = '../lpod/templates/text.ott'
+        document = odf_new_document(path)
+        document.get_body().append(odf_create_paragraph('First only'))
+        other = odf_new_document(path)
+        self.assertFalse(other.get_body().match('First only'))
+
+
     def test_mimetype(self):
         path = '../lpod/templates/drawing.otg'
         document = odf_new_document(path)
@@ -170,6 +179,31 @@ class DocumentTestCase(TestCase):
         self.assertEqual(container.path, None)
 
 
+    def test_clone_body(self):
+        document = self.document
+        body = document.get_body()
+        clone = document.clone()
+        clone.get_body().append(odf_create_paragraph('Clone only'))
+        self.assertEqual(clone.get_part(ODF_CONTENT).container,
+                clone.container)
+        self.assertFalse(body.match('Clone only'))
+        self.assertTrue(clone.get_body().match('Clone only'))
+
+
+    def test_save_unmodified_parts(self):
+        document = odf_get_document('samples/example.odt')
+        styles = document.get_part(ODF_STYLES)
+        styles.get_styles()
+        content = document.get_part(ODF_CONTENT)
+        content.get_body().append(odf_create_paragraph('Saved'))
+        self.assertFalse(styles.is_modified())
+        self.assertTrue(content.is_modified())
+        document.save(BytesIO())
+        modified = document.container._odf_container__modified
+        self.assertTrue(ODF_CONTENT in modified)
+        self.assertFalse(ODF_STYLES in modified)
+
+
     def test_save_nogenerator(self):
         document = self.document
         temp = StringIO()
@@ -33,6 +33,8 @@ from re import compile
 from lpod.const import ODF_CONTENT
 from lpod.container import odf_get_container
 from lpod.element import register_element_class, odf_create_element
+from lpod.element import _find_query_in_cache, ODF_NAMESPACES
+from lpod.element import _get_clark_name, _get_prefixed_name
 from lpod.element import odf_element, FIRST_CHILD, NEXT_SIBLING, PREV_SIBLING
 from lpod.xmlpart import odf_xmlpart
 
@@ -56,6 +58,15 @@ class CreateElementTestCase(TestCase):
         self.assertEqual(element.serialize(), '<text:p/>')
 
 
+    def test_independent(self):
+        element = odf_create_element('text:p')
+        element.set_text('changed')
+        element.append(odf_create_element('text:span'))
+        other = odf_create_element('text:p')
+        self.assertEqual(other.serialize(), '<text:p/>')
+        self.assertEqual(other.get_parent().get_tag(), 'office:document')
+
+
 
 class ElementTestCase(TestCase):
 
@@ -234,6 +245,20 @@ class ElementAttributeTestCase(TestCase):
         self.assertEqual(element.get_attribute('text:style-name'), None)
 
 
+    def test_attribute_unknown_prefix(self):
+        element = self.paragraph_element
+        self.assertRaises(ValueError, element.get_attribute, 'foo:bar')
+        self.assertRaises(ValueError, element.set_attribute, 'foo:bar', "x")
+
+
+    def test_qualified_names(self):
+        tag = '{%s}style-name' % ODF_NAMESPACES['text']
+        self.assertEqual(_get_clark_name('text:style-name'), tag)
+        self.assertEqual(_get_clark_name('style-name'), 'style-name')
+        self.assertEqual(_get_prefixed_name(tag), 'text:style-name')
+        self.assertRaises(ValueError, _get_prefixed_name, '{urn:foo}bar')
+
+
 
 class ElementTextTestCase(TestCase):
 
@@ -291,6 +316,43 @@ class ElementTextTestCase(TestCase):
 
 
 
+class ElementIterTextTestCase(TestCase):
+
+    def setUp(self):
+        self.element = odf_create_element('<text:p>a<text:span>b<!--c-->d'
+                '</text:span>e<office:annotation>f<text:p>g</text:p>h'
+                '</office:annotation><?i j?>k<text:s/></text:p>')
+
+
+    def test_iter_text(self):
+        element = self.element
+        texts = [text for container, is_tail, text in element.iter_text()]
+        self.assertEqual(texts, element.xpath('descendant::text()'))
+        self.assertEqual(texts, list('abdefghk'))
+
+
+    def test_iter_text_containers(self):
+        element = self.element
+        result = list(element.iter_text())
+        # "d" is the tail of the comment
+        del result[2]
+        result = [(container.get_tag(), is_tail, text)
+                  for container, is_tail, text in result[:3]]
+        self.assertEqual(result, [('text:p', False, 'a'),
+                                  ('text:span', False, 'b'),
+                                  ('text:span', True, 'e')])
+
+
+    def test_iter_text_main(self):
+        element = self.element
+        texts = [text for container, is_tail, text
+                 in element.iter_text(main_text=True)]
+        self.assertEqual(texts, element.xpath(
+            'descendant::text()[not (parent::office:annotation)]'))
+        self.assertEqual(texts, list('abdegk'))
+
+
+
 class ElementTraverseTestCase(TestCase):
 
     def setUp(self):
@@ -315,6 +377,25 @@ class ElementTraverseTestCase(TestCase):
         self.assertEqual(parent, None)
 
 
+    def test_get_element_position(self):
+        element = odf_create_element('<office:text><text:p>1</text:p>'
+            '<text:section><text:p>2</text:p></text:section>'
+            '<text:p text:style-name="Standard">3</text:p></office:text>')
+        for position, text in [(0, '1'), (1, '2'), (2, '3'), (-1, '3'),
+                               (-3, '1')]:
+            paragraph = element.get_element('descendant::text:p', position)
+            self.assertEqual(paragraph.get_text(), text)
+        self.assertEqual(element.get_element('text:p', 1).get_text(), '3')
+        self.assertEqual(element.get_element('descendant::text:p', 3), None)
+        self.assertEqual(element.get_element('descendant::text:p', -4), None)
+        paragraph = element.get_element('descendant::text:p[@text:style-name]',
+                                        -1)
+        self.assertEqual(paragraph.get_text(), '3')
+        paragraph = element.get_element(
+                'descendant::text:p[@text:style-name=$name]', name="Standard")
+        self.assertEqual(paragraph.get_text(), '3')
+
+
     def test_insert_element_first_child(self):
         element = odf_create_element(
             '<office:text><text:p/><text:p/></office:text>')
@@ -456,6 +537,18 @@ class SearchTestCase(TestCase):
 
 
 
+    def test_xpath_variables(self):
+        query = 'descendant::text:span[@text:style-name=$name]'
+        spans = self.paragraph.get_elements(query, name='T1')
+        self.assertEqual(len(spans), 1)
+        info = _find_query_in_cache.cache_info()
+        spans = self.paragraph.xpath(query, name='"T2"')
+        self.assertEqual(spans, [])
+        self.assertEqual(_find_query_in_cache.cache_info().hits,
+                         info.hits + 1)
+
+
+
 class MatchTestCase(TestCase):
 
     def setUp(self):
@@ -61,6 +61,27 @@ class TestParagraph(TestCase):
         self.assertEqual(text, 'This is a paragraph with a named style.')
 
 
+    def test_iter_paragraphs(self):
+        body = self.body
+        paragraphs = body.iter_paragraphs()
+        self.assertFalse(isinstance(paragraphs, list))
+        self.assertEqual([p.get_text() for p in paragraphs],
+                         [p.get_text() for p in body.get_paragraphs()])
+        paragraphs = body.iter_paragraphs(style='Hanging_20_indent')
+        paragraph = next(paragraphs)
+        self.assertEqual(paragraph.get_text(),
+                         'This is a paragraph with a named style.')
+        self.assertEqual(list(paragraphs), [])
+
+
+    def test_iter_paragraphs_content(self):
+        body = self.body
+        paragraphs = body.iter_paragraphs(content='second')
+        self.assertEqual([p.get_text() for p in paragraphs],
+                         [p.get_text() for p in
+                          body.get_paragraphs(content='second')])
+
+
     def test_get_paragraph_list_context(self):
         body = self.body
         section2 = body.get_section(position=1)
@@ -0,0 +1,200 @@
+# -*- coding: UTF-8 -*-
+#
+# Copyright (c) 2009-2010 Ars Aperta, Itaapy, Pierlis, Talend.
+#
+# This file is part of Lpod (see: http://lpod-project.net).
+# Lpod is free software; you can redistribute it and/or modify it under
+# the terms of either:
+#
+# a) the GNU General Public License as published by the Free Software
+#    Foundation, either version 3 of the License, or (at your option)
+#    any later version.
+#    Lpod is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#    You should have received a copy of the GNU General Public License
+#    along with Lpod.  If not, see <http://www.gnu.org/licenses/>.
+#
+# b) the Apache License, Version 2.0 (the "License");
+
+# Import from the Standard Library
+from datetime import date, datetime
+from io import BytesIO
+from os import listdir
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase, main, skipIf
+
+# Import from NumPy
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Import from lpod
+from lpod.document import odf_get_document
+from lpod.spreadsheet_writer import odf_spreadsheet_writer
+
+
+
+class Broken(BytesIO):
+    """File failing after a few writes.
+    """
+
+    def write(self, data):
+        if self.tell() > 10000:
+            raise IOError('disk full')
+        return BytesIO.write(self, data)
+
+
+
+class TestSpreadsheetWriter(TestCase):
+
+    def get_document(self, file):
+        return odf_get_document(BytesIO(file.getvalue()))
+
+
+    def test_write_rows(self):
+        file = BytesIO()
+        with odf_spreadsheet_writer(file) as writer:
+            sheet = writer.add_sheet('Data')
+            sheet.write_row(['name', 'total', 'day'])
+            sheet.write_row(['bob', 1.5, date(2011, 2, 3)])
+            sheet.write_row([None, 'a<&>"', True], style='Style')
+        table = self.get_document(file).get_body().get_table(name='Data')
+        self.assertEqual(table.get_width(), 3)
+        self.assertEqual(table.get_values(),
+                         [['name', 'total', 'day'],
+                          ['bob', 1.5, datetime(2011, 2, 3)],
+                          [None, 'a<&>"', True]])
+        self.assertEqual(table.get_cell('A3').get_style(), 'Style')
+
+
+    def test_repeated(self):
+        file = BytesIO()
+        with odf_spreadsheet_writer(file) as writer:
+            sheet = writer.add_sheet('Data')
+            for dummy in range(100):
+                sheet.write_row([1, 1, 1, 'a'])
+            sheet.write_row([2])
+        table = self.get_document(file).get_body().get_table(name='Data')
+        self.assertEqual(len(table.get_elements('table:table-row')), 2)
+        self.assertEqual(table.get_height(), 101)
+        self.assertEqual(table.get_row_values(99), [1, 1, 1, 'a'])
+        self.assertEqual(table.get_row_values(100), [2, None, None, None])
+
+
+    def test_sheets(self):
+        file = BytesIO()
+        writer = odf_spreadsheet_writer(file)
+        first = writer.add_sheet('First', width=5)
+        first.write_row([1])
+        second = writer.add_sheet('Second')
+        self.assertRaises(ValueError, first.write_row, [2])
+        second.write_row([3, 4])
+        writer.close()
+        self.assertRaises(ValueError, writer.add_sheet, 'Third')
+        tables = self.get_document(file).get_body().get_tables()
+        self.assertEqual([table.get_name() for table in tables],
+                         ['First', 'Second'])
+        self.assertEqual(tables[0].get_width(), 5)
+        self.assertEqual(tables[1].get_values(), [[3, 4]])
+
+
+    def test_template(self):
+        file = BytesIO()
+        with odf_spreadsheet_writer(file,
+                template='samples/simple_table.ods') as writer:
+            writer.add_sheet('New').write_row([1, 2])
+        document = self.get_document(file)
+        tables = document.get_body().get_tables()
+        self.assertEqual([table.get_name() for table in tables], ['New'])
+        self.assertNotEqual(document.get_styles('table-cell'), [])
+
+
+    def test_abort(self):
+        file = BytesIO()
+        try:
+            with odf_spreadsheet_writer(file) as writer:
+                sheet = writer.add_sheet('Data')
+                for value in range(10000):
+                    sheet.write_row([value])
+                raise KeyError(value)
+        except KeyError:
+            pass
+        self.assertRaises(Exception, odf_get_document, BytesIO(
+            file.getvalue()))
+
+
+    def test_abort_path(self):
+        folder = mkdtemp()
+        try:
+            path = join(folder, 'abort.ods')
+            try:
+                with odf_spreadsheet_writer(path) as writer:
+                    sheet = writer.add_sheet('Data')
+                    for value in range(50000):
+                        sheet.write_row([value])
+                    raise KeyError(value)
+            except KeyError:
+                pass
+            self.assertEqual(listdir(folder), [])
+        finally:
+            rmtree(folder)
+
+
+    def test_path(self):
+        folder = mkdtemp()
+        try:
+            path = join(folder, 'export.ods')
+            with odf_spreadsheet_writer(path) as writer:
+                writer.add_sheet('Data').write_row([1, 2])
+            self.assertEqual(listdir(folder), ['export.ods'])
+            table = odf_get_document(path).get_body().get_table(name='Data')
+            self.assertEqual(table.get_values(), [[1, 2]])
+        finally:
+            rmtree(folder)
+
+
+    def test_width(self):
+        file = BytesIO()
+        with odf_spreadsheet_writer(file) as writer:
+            sheet = writer.add_sheet('Data')
+            sheet.write_row(iter([1]))
+            self.assertRaises(ValueError, sheet.write_row, [1, 2, 3])
+            sheet = writer.add_sheet('Wide', width=3)
+            sheet.write_row(value for value in (1,))
+            sheet.write_row([1, 2, 3])
+        body = self.get_document(file).get_body()
+        self.assertEqual(body.get_table(name='Data').get_values(), [[1]])
+        self.assertEqual(body.get_table(name='Wide').get_values(),
+                         [[1, None, None], [1, 2, 3]])
+
+
+    @skipIf(numpy is None, 'NumPy is not installed')
+    def test_numpy_datetime(self):
+        file = BytesIO()
+        with odf_spreadsheet_writer(file) as writer:
+            sheet = writer.add_sheet('Data')
+            sheet.write_row(numpy.array(['2020-01-02T03:04:05', 'NaT'],
+                                        dtype='datetime64[ns]'))
+        table = self.get_document(file).get_body().get_table(name='Data')
+        self.assertEqual(table.get_values(),
+                         [[datetime(2020, 1, 2, 3, 4, 5), None]])
+        self.assertEqual(table.get_cell('A1').get_type(), 'date')
+
+
+    def test_broken_target(self):
+        file = Broken()
+        def write():
+            with odf_spreadsheet_writer(file) as writer:
+                sheet = writer.add_sheet('Data')
+                for value in range(100000):
+                    sheet.write_row([value, str(value)])
+        self.assertRaises(IOError, write)
+
+
+if __name__ == '__main__':
+    main()
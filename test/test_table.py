@@ -31,12 +31,20 @@
 from datetime import date, datetime, timedelta
 from decimal import Decimal as dec
 from io import StringIO
-from unittest import TestCase, main
+from unittest import TestCase, main, skipIf
+
+# Import from NumPy
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # Import from lpod
 from lpod.document import odf_get_document
+from lpod.element import odf_create_element
 from lpod.table import _alpha_to_digit, _digit_to_alpha
 from lpod.table import _convert_coordinates, odf_cell, odf_row
+from lpod.table import _position_map
 from lpod.table import odf_create_cell, odf_create_row, odf_create_column
 from lpod.table import odf_create_table, import_from_csv, odf_column
 from lpod.table import odf_create_named_range, import_from_csv, odf_column
@@ -152,6 +160,59 @@ class TestCoordinates(TestCase):
 
 
 
+class TestPositionMap(TestCase):
+
+    def test_map(self):
+        map = _position_map([3, 1, 3])
+        self.assertEqual(list(map), [2, 3, 6])
+        self.assertEqual(len(map), 3)
+        self.assertEqual(map[1], 3)
+        self.assertEqual(map[-1], 6)
+        self.assertEqual(map[1:], [3, 6])
+
+
+    def test_find(self):
+        map = _position_map([3, 1, 3])
+        self.assertEqual([map.find(x) for x in range(8)],
+                         [0, 0, 0, 1, 2, 2, 2, None])
+
+
+    def test_insert_erase(self):
+        map = _position_map([3, 1, 3])
+        map.insert(1, 2, 'item')
+        self.assertEqual(list(map), [2, 4, 5, 8])
+        self.assertEqual(map.get_item(1), 'item')
+        map.insert(4, 1)
+        self.assertEqual(list(map), [2, 4, 5, 8, 9])
+        map.erase(0)
+        self.assertEqual(list(map), [1, 2, 5, 6])
+        self.assertEqual(map.get_item(0), 'item')
+        map.set_repeated(0, 1)
+        self.assertEqual(list(map), [0, 1, 4, 5])
+        self.assertRaises(IndexError, map.erase, 4)
+
+
+    def test_big_map(self):
+        repeats = [1 + i % 3 for i in range(1000)]
+        map = _position_map(repeats)
+        for i in range(0, 1000, 7):
+            map.insert(i, 2)
+            repeats.insert(i, 2)
+        for i in range(0, 1000, 11):
+            map.erase(i)
+            del repeats[i]
+        ends = []
+        position = -1
+        for repeated in repeats:
+            position += repeated
+            ends.append(position)
+        self.assertEqual(list(map), ends)
+        self.assertEqual([map[i] for i in range(len(ends))], ends)
+        self.assertEqual(map.find(ends[500]), 500)
+        self.assertEqual(map.find(ends[500] + 1), 501)
+
+
+
 class TestCreateCell(TestCase):
 
     def test_bool(self):
@@ -718,6 +779,27 @@ class TestRowCell(TestCase):
         self.assertEqual(len(list(self.row.traverse(-5, -1))), 0)
 
 
+    def test_traverse_no_clone(self):
+        row = self.row_repeats
+        cells = list(row.traverse(clone=False))
+        self.assertEqual(len(cells), 7)
+        # The repeated cell itself
+        self.assertTrue(cells[0] is cells[2])
+        self.assertEqual(cells[0].get_repeated(), 3)
+        self.assertEqual(row.get_width(), 7)
+
+
+    def test_get_cell_no_clone(self):
+        cell = self.row.get_cell(3)
+        cell.set_value(9)
+        self.assertEqual(self.row.get_value(3), 2)
+        cell = self.row.get_cell(3, clone=False)
+        self.assertEqual(cell.get_value(), 2)
+        # Not a copy
+        cell.set_value(9)
+        self.assertEqual(self.row.get_value(3), 9)
+
+
     def test_get_cells(self):
         self.assertEqual(len(list(self.row.get_cells())), 7)
 
@@ -3008,6 +3090,130 @@ class TestTableGetValues(TestCase):
 
 
 
+@skipIf(numpy is None, 'NumPy is not installed')
+class TestTableToArray(TestCase):
+
+    def setUp(self):
+        document = odf_get_document('samples/simple_table.ods')
+        body = document.get_body()
+        self.table = body.get_table(name="Example1").clone()
+
+
+    def test_to_array(self):
+        columns = self.table.to_array()
+        self.assertEqual(len(columns), 7)
+        for column in columns:
+            self.assertEqual(column.dtype, numpy.float64)
+        self.assertEqual(columns[0].tolist(), [1.0, 1.0, 1.0, 1.0])
+        self.assertEqual(columns[6].tolist(), [3.0, 3.0, 3.0, 7.0])
+
+
+    def test_to_array_coord(self):
+        columns = self.table.to_array('C2:E4')
+        self.assertEqual([column.tolist() for column in columns],
+                         [[1.0, 1.0, 3.0], [2.0, 2.0, 4.0],
+                          [3.0, 3.0, 5.0]])
+
+
+    def test_to_array_empty_table(self):
+        self.assertEqual(odf_create_table('Table').to_array(), [])
+
+
+    def test_to_array_types(self):
+        table = odf_create_table('Table', width=6, height=3)
+        table.set_values([[1.5, date(2011, 2, 3), 'a', True,
+                           timedelta(hours=2), 1],
+                          [None, None, None, None, None, 'b'],
+                          [2, datetime(2011, 2, 3, 4, 5), 'c', False,
+                           timedelta(minutes=5), None]])
+        columns = table.to_array()
+        self.assertEqual([column.dtype.kind for column in columns],
+                         ['f', 'M', 'O', 'b', 'm', 'O'])
+        for column in columns[:5]:
+            self.assertEqual(column.mask.tolist(), [False, True, False])
+        self.assertEqual(columns[0].tolist(), [1.5, None, 2.0])
+        self.assertEqual(columns[1].tolist(), [datetime(2011, 2, 3), None,
+                                               datetime(2011, 2, 3, 4, 5)])
+        self.assertEqual(columns[2].tolist(), ['a', None, 'c'])
+        self.assertEqual(columns[3].tolist(), [True, None, False])
+        self.assertEqual(columns[4].tolist(), [timedelta(hours=2), None,
+                                               timedelta(minutes=5)])
+        self.assertEqual(columns[5].tolist(), [1.0, 'b', None])
+
+
+    def test_to_array_repeated(self):
+        table = odf_create_table('Table')
+        row = odf_create_row()
+        row.set_value(0, 1.5)
+        row.set_value(1, 'a')
+        row.set_repeated(3)
+        table.append_row(row)
+        cell = odf_create_cell(2, repeated=2)
+        row = odf_create_row()
+        row.append_cell(cell)
+        table.append_row(row)
+        columns = table.to_array()
+        self.assertEqual([column.tolist() for column in columns],
+                         [[1.5, 1.5, 1.5, 2.0], ['a', 'a', 'a', 2.0]])
+
+
+
+class TestTableFromArray(TestCase):
+
+    def setUp(self):
+        document = odf_get_document('samples/simple_table.ods')
+        body = document.get_body()
+        self.table = body.get_table(name="Example1").clone()
+
+
+    def test_from_array_like_set_values(self):
+        values = [['a', 1, None, 2.5], [], [True, date(2011, 2, 3)]]
+        for coord in (None, 'B2', 'F3', 'C7'):
+            expected = self.table.clone()
+            expected.set_values(values, coord=coord)
+            table = self.table.clone()
+            table.from_array(values, coord=coord)
+            self.assertEqual(table.get_values(), expected.get_values())
+            self.assertEqual(table.get_width(), expected.get_width())
+            self.assertEqual(table.get_height(), expected.get_height())
+
+
+    def test_from_array_style(self):
+        table = self.table
+        table.from_array([[None, 4]], coord='B1', style='Style')
+        self.assertEqual(table.get_cell('A1').get_style(), None)
+        self.assertEqual(table.get_cell('B1').get_style(), 'Style')
+        self.assertEqual(table.get_cell('C1').get_value(), 4)
+        self.assertEqual(table.get_cell('C1').get_style(), 'Style')
+
+
+    def test_from_array_repeated(self):
+        table = odf_create_table('Table')
+        table.from_array([[1, 1, 1, 'a', 'a', None, None]])
+        row = table.get_row(0)
+        self.assertEqual(len(row.get_elements('table:table-cell')), 3)
+        self.assertEqual(row.get_values(), [1, 1, 1, 'a', 'a', None, None])
+        self.assertEqual(table.get_width(), 7)
+
+
+    @skipIf(numpy is None, 'NumPy is not installed')
+    def test_from_array_numpy(self):
+        table = odf_create_table('Table')
+        table.from_array(numpy.array([[1.5, numpy.nan], [2.0, 3.0]]))
+        self.assertEqual(table.get_values(), [[dec('1.5'), None], [2, 3]])
+
+
+    @skipIf(numpy is None, 'NumPy is not installed')
+    def test_from_array_numpy_datetime(self):
+        table = odf_create_table('Table')
+        table.from_array(numpy.array([['2020-01-02T03:04:05', 'NaT']],
+                                     dtype='datetime64[ns]'))
+        self.assertEqual(table.get_values(),
+                         [[datetime(2020, 1, 2, 3, 4, 5), None]])
+        self.assertEqual(table.get_cell('A1').get_type(), 'date')
+
+
+
 class TestTableCache(TestCase):
 
     def setUp(self):
@@ -3091,6 +3297,60 @@ class TestTableCache(TestCase):
         self.assertEqual(table.get_height(), 0)
 
 
+    def test_lazy_cache(self):
+        def is_computed(element, name):
+            # Not going through __getattr__ that computes it
+            try:
+                object.__getattribute__(element, name)
+            except AttributeError:
+                return False
+            return True
+        table = self.body.get_table(name="Example1")
+        self.assertFalse(is_computed(table, '_tmap'))
+        self.assertEqual(table.get_height(), 4)
+        self.assertTrue(is_computed(table, '_tmap'))
+        row = table.get_elements('table:table-row')[0]
+        self.assertFalse(is_computed(row, '_rmap'))
+        self.assertEqual(row.get_width(), 7)
+        self.assertTrue(is_computed(row, '_rmap'))
+
+
+    def test_compute_cache(self):
+        table = odf_create_table('Table')
+        table.append_row(odf_create_row(width=2, repeated=3))
+        table.append_row(odf_create_row(width=4))
+        table.append_row(odf_create_row(width=3, repeated=2))
+        table = odf_create_element(table.serialize())
+        self.assertEqual(list(table._tmap), [2, 3, 5])
+        self.assertEqual(list(table._cmap), [1, 3])
+        self.assertEqual(table.get_height(), 6)
+        self.assertEqual(table.get_row(3).get_width(), 4)
+        self.assertEqual(table.get_row(5).get_width(), 3)
+
+
+    def test_batch(self):
+        table = odf_create_table('Batch')
+        with table.batch():
+            for y in range(5):
+                row = odf_create_row()
+                row.set_values(list(range(y + 1)))
+                table.append_row(row)
+            self.assertEqual(table.get_height(), 5)
+        self.assertEqual(table.get_size(), (5, 5))
+        self.assertEqual(table.get_value((4, 4)), 4)
+        self.assertEqual(table.get_value((0, 4)), 0)
+        self.assertEqual(len(table.get_columns()), 5)
+
+
+    def test_batch_row(self):
+        row = odf_create_row()
+        with row.batch():
+            for x in range(4):
+                row.append_cell(odf_create_cell(x))
+        self.assertEqual(row.get_width(), 4)
+        self.assertEqual(row.get_values(), [0, 1, 2, 3])
+
+
     def test_lonely_cell_add_cache(self):
         table = self.table.clone()
         table.clear()
@@ -3136,6 +3396,25 @@ class TestTableRow(TestCase):
         self.assertEqual(len(list(self.table.traverse())), 4)
 
 
+    def test_traverse_rows_no_clone(self):
+        table = odf_create_table('Table')
+        table.append_row(odf_create_row(width=2, repeated=3))
+        rows = [(row.y, row) for row in table.traverse(clone=False)]
+        self.assertEqual([y for y, row in rows], [0, 1, 2])
+        # The repeated row itself
+        self.assertTrue(rows[0][1] is rows[2][1])
+        self.assertEqual(rows[0][1].get_repeated(), 3)
+        self.assertEqual(table.get_height(), 3)
+
+
+    def test_clone_cache(self):
+        self.assertEqual(self.table.get_size(), (7, 4))
+        clone = self.table.clone()
+        clone.append_row(odf_create_row(width=7))
+        self.assertEqual(clone.get_size(), (7, 5))
+        self.assertEqual(self.table.get_size(), (7, 4))
+
+
     def test_get_row_values(self):
         self.assertEqual(self.table.get_row_values(3), [1, 2, 3, 4, 5, 6, 7])
 
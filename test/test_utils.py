@@ -78,6 +78,16 @@ class GenerateXPathTestCase(TestCase):
         self.assertEqual(query, expected)
 
 
+    def test_variables(self):
+        variables = {}
+        query = _make_xpath_query('descendant::text:h',
+                text_style="Standard", outline_level=1, variables=variables)
+        expected = ('descendant::text:h[@text:outline-level=$v0]'
+                    '[@text:style-name=$v1]')
+        self.assertEqual(query, expected)
+        self.assertEqual(variables, {'v0': '1', 'v1': 'Standard'})
+
+
 
 class Get_ValueTestCase(TestCase):
 
@@ -26,6 +26,7 @@
 #
 
 # Import from the Standard Library
+from io import BytesIO
 from unittest import TestCase, main
 
 # Import from the XML Library
@@ -83,6 +84,16 @@ class XmlPartTestCase(TestCase):
         self.assertEqual(content_bytes, serialized)
 
 
+    def test_write(self):
+        content_part = odf_xmlpart(ODF_CONTENT, self.container)
+        file = BytesIO()
+        content_part.write(file)
+        data = file.getvalue()
+        self.assertTrue(data.startswith(b'<?xml version="1.0" '
+                b'encoding="UTF-8"?>\n<office:document-content'))
+        self.assertEqual(data.decode('utf-8'), content_part.serialize())
+
+
     def test_pretty_serialize(self):
         # With pretty = True
         element = odf_create_element('<root><a>spam</a><b/></root>')
@@ -105,6 +116,44 @@ class XmlPartTestCase(TestCase):
         self.assertEqual(clone._odf_xmlpart__tree, None)
 
 
+    def test_clone_copy_on_write(self):
+        content = odf_xmlpart(ODF_CONTENT, self.container)
+        paragraph = content.get_element('//text:p')
+        clone = content.clone()
+        # Still shared
+        self.assertEqual(clone._odf_xmlpart__tree, None)
+        self.assertEqual(clone.serialize(), content.serialize())
+        # The clone gets its copy before the source changes
+        paragraph.set_text('Changed')
+        self.assertNotEqual(clone._odf_xmlpart__tree, None)
+        self.assertNotEqual(clone.get_element('//text:p').get_text(),
+                'Changed')
+
+
+    def test_clone_write_clone(self):
+        content = odf_xmlpart(ODF_CONTENT, self.container)
+        content.get_root()
+        clone = content.clone()
+        clone.get_element('//text:p').set_text('Changed')
+        self.assertNotEqual(content.get_element('//text:p').get_text(),
+                'Changed')
+        self.assertEqual(clone.get_element('//text:p').get_text(),
+                'Changed')
+
+
+    def test_is_modified(self):
+        content = odf_xmlpart(ODF_CONTENT, self.container)
+        paragraph = content.get_element('//text:p')
+        self.assertFalse(content.is_modified())
+        paragraph.set_text('Changed')
+        self.assertTrue(content.is_modified())
+        # Detached elements are not part of it
+        content = odf_xmlpart(ODF_CONTENT, self.container)
+        paragraph = content.get_element('//text:p').clone()
+        paragraph.set_text('Changed')
+        self.assertFalse(content.is_modified())
+
+
     def test_delete(self):
         container = self.container
         content = odf_xmlpart(ODF_CONTENT, container)
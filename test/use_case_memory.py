@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+# Memory allocated per element returned by get_elements: the Python wrapper,
+# the lxml proxy it keeps and the list slot, not the lxml nodes themselves.
+#
+# Measured with Python 3.11, bytes per element:
+#
+#                   instance dict   __slots__
+#   odf_paragraph        242           202
+#   odf_cell             268           228
+#   odf_row              546           498
+
+import tracemalloc
+# Import from lpod
+from lpod.paragraph import odf_create_paragraph
+from lpod.table import odf_create_table, odf_create_row
+from lpod import __version__ as version
+
+COUNT = 10000
+
+
+def measure(name, make_wrappers):
+    # Keep the native elements out of the measure
+    wrappers = make_wrappers()
+    del wrappers
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    wrappers = make_wrappers()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    print("%-20s %5d bytes per element" % (name, size // len(wrappers)))
+
+
+if __name__=="__main__":
+    print(version)
+    body = odf_create_paragraph()
+    for dummy in range(COUNT):
+        body.append(odf_create_paragraph('x'))
+    row = odf_create_row(width=COUNT)
+    table = odf_create_table("Table", width=10, height=COUNT)
+    measure("odf_paragraph", lambda: body.get_elements('text:p'))
+    measure("odf_cell", lambda: row.get_elements('table:table-cell'))
+    measure("odf_row", lambda: table.get_elements('table:table-row'))